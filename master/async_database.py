@@ -0,0 +1,109 @@
+"""
+Async facade over Database.
+
+Runs the blocking sqlite3 calls on a small dedicated thread pool so the
+FastAPI event loop (WebSocket broadcasts, chunk downloads) never waits on a
+write. Usage mirrors Database: ``await adb.claim_next_task(worker_id)``.
+"""
+
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +inf.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram for one query type."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + ["+inf"]
+        return {
+            "count": self.total,
+            "avg_ms": round(self.sum_ms / self.total, 3) if self.total else 0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class AsyncDatabase:
+    def __init__(self, db: Database, max_workers: int = 2, max_pending: int = 256):
+        """
+        Args:
+            db: The synchronous Database to wrap
+            max_workers: Number of DB executor threads
+            max_pending: Max queued + running calls; further callers wait
+        """
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="db")
+        self._max_pending = max_pending
+        self._slots: asyncio.Semaphore | None = None
+        self._pending = 0
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._hist_lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(name, functools.partial(method, *args, **kwargs))
+
+        return call
+
+    async def run(self, query_type: str, fn):
+        """Run fn() on the DB executor, recording its latency under query_type."""
+        if self._slots is None:
+            # Created lazily so it binds to the running event loop.
+            self._slots = asyncio.Semaphore(self._max_pending)
+        async with self._slots:
+            self._pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, self._timed, query_type, fn)
+            finally:
+                self._pending -= 1
+
+    def _timed(self, query_type: str, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._hist_lock:
+                hist = self.histograms.setdefault(query_type, LatencyHistogram())
+                hist.observe(elapsed_ms)
+
+    def stats(self) -> dict:
+        """Queue depth and per-query latency histograms."""
+        with self._hist_lock:
+            queries = {name: h.to_dict() for name, h in sorted(self.histograms.items())}
+        return {
+            "pending": self._pending,
+            "max_pending": self._max_pending,
+            "queries": queries,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.db.close()
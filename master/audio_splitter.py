@@ -10,12 +10,74 @@ Optimized for minimal bandwidth:
 import asyncio
 import subprocess
 import json
+import re
 from pathlib import Path
 
+from ffmpeg_scheduler import PRIORITY_SPLIT, FFmpegScheduler
+
+# Containers ffmpeg can demux from a non-seekable pipe as bytes arrive, so they
+# can be split while the upload is still in flight. MP4/M4B keep their index
+# (moov atom) at the end of the file and must be fully received first.
+STREAMABLE_EXTENSIONS = {".mp3", ".ogg", ".oga", ".opus", ".flac"}
+
+# Archival copy kept next to the transcript: 32kbps mono MP3 (excellent voice
+# quality, tiny file size)
+ARCHIVE_ENCODE_ARGS = ["-ar", "22050", "-ac", "1", "-b:a", "32k"]
+
+# Shortest chunk a pause-aligned cut may leave, as a fraction of chunk_duration
+MIN_CUT_SPACING = 0.5
+
+SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END_RE = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+
+def plan_cut_points(duration: float, chunk_duration: float,
+                    silences: list[tuple[float, float]], window: float) -> list[float]:
+    """
+    Choose chunk cut points, moving each nominal cut (every chunk_duration
+    seconds) to the middle of the nearest pause within +/- window seconds.
+    Cuts with no pause in range stay where they are. A moved cut that would
+    leave a chunk shorter than MIN_CUT_SPACING * chunk_duration (two cuts
+    snapping to the same pause) falls back to the nominal cut, which is
+    dropped if it too is that close to the previous cut or not inside the file.
+    """
+    num_chunks = int(duration // chunk_duration) + 1
+    min_gap = chunk_duration * MIN_CUT_SPACING
+    cuts = []
+    previous = 0.0
+    for i in range(1, num_chunks):
+        nominal = i * chunk_duration
+        best = nominal
+        if window > 0:
+            best_distance = None
+            for start, end in silences:
+                if end < nominal - window:
+                    continue
+                if start > nominal + window:
+                    break
+                # Nearest point of this pause to the nominal cut, then centre
+                # on the pause as far as the window allows
+                middle = (start + end) / 2
+                candidate = min(max(middle, nominal - window), nominal + window)
+                distance = abs(candidate - nominal)
+                if best_distance is None or distance < best_distance:
+                    best, best_distance = candidate, distance
+        if best - previous < min_gap or duration - best < min_gap:
+            best = nominal
+        if best - previous < min_gap or best >= duration:
+            continue
+        cuts.append(best)
+        previous = best
+    return cuts
+
 
 class AudioSplitter:
     def __init__(self, output_dir: Path, chunk_duration: int = 1200, 
-                 audio_format: str = "mp3", bitrate: str = "48k"):
+                 audio_format: str = "mp3", bitrate: str = "48k",
+                 engine: str = "segment", boundary_window: float = 0,
+                 silence_threshold_db: float = -35, min_silence: float = 0.3,
+                 overlap: float = 0, scheduler: FFmpegScheduler = None,
+                 probe_store=None):
         """
         Initialize the audio splitter.
 
@@ -24,20 +86,116 @@ class AudioSplitter:
             chunk_duration: Duration of each chunk in seconds (default 20 minutes)
             audio_format: Output format - "mp3" (small) or "wav" (lossless)
             bitrate: Bitrate for compressed formats (default 48k, good for speech)
+            engine: "segment" decodes the source once and cuts every chunk with
+                ffmpeg's segment muxer; "per_chunk" runs one seeking ffmpeg per chunk
+            boundary_window: Move each cut to the nearest pause within this many
+                seconds (0 = fixed cuts every chunk_duration)
+            silence_threshold_db: Level below which audio counts as a pause
+            min_silence: Shortest pause (seconds) considered for a cut
+            overlap: Seconds each chunk repeats from the end of the previous one;
+                merge_book_results de-duplicates the shared region. Overlapping
+                chunks are always cut with the per_chunk engine.
+            scheduler: Shared ffmpeg job scheduler (default: a private one)
+            probe_store: Persistent probe cache with async get_probe(sha256) and
+                save_probe(sha256, probe), e.g. the master's AsyncDatabase
         """
+        if engine not in ("segment", "per_chunk"):
+            raise ValueError(f"Unknown splitting engine: {engine}")
         self.output_dir = Path(output_dir)
         self.chunk_duration = chunk_duration
         self.audio_format = audio_format
         self.bitrate = bitrate
+        self.engine = engine
+        self.boundary_window = boundary_window
+        self.silence_threshold_db = silence_threshold_db
+        self.min_silence = min_silence
+        self.overlap = overlap
+        self.scheduler = scheduler or FFmpegScheduler()
+        self.probe_store = probe_store
+        self._probes: dict[str, dict] = {}  # sha256 -> probe, this process
         self.output_dir.mkdir(exist_ok=True)
 
-    async def get_audio_duration(self, audio_path: Path) -> float:
+    def is_streamable(self, filename: str) -> bool:
+        """Whether a file of this type can be split while it is still arriving."""
+        return Path(filename).suffix.lower() in STREAMABLE_EXTENSIONS
+
+    def fuses_archive(self) -> bool:
+        """Whether split_audio can write the archival MP3 in the same decode pass."""
+        return self.engine == "segment" and self.overlap <= 0
+
+    def _encode_args(self) -> list[str]:
+        """Output resampling and codec arguments shared by every splitting mode."""
+        args = [
+            "-ar", "16000",  # 16kHz sample rate (optimal for Whisper)
+            "-ac", "1",  # Mono
+        ]
+
+        # Format-specific encoding
+        if self.audio_format == "mp3":
+            args.extend([
+                "-c:a", "libmp3lame",
+                "-b:a", self.bitrate,  # e.g., "48k" - good for speech
+            ])
+        elif self.audio_format == "opus":
+            args.extend([
+                "-c:a", "libopus",
+                "-b:a", self.bitrate,
+            ])
+        else:  # wav (fallback)
+            args.extend([
+                "-c:a", "pcm_s16le",  # 16-bit PCM
+            ])
+        return args
+
+    async def start_stream_split(self, book_id: str, on_chunk=None,
+                                 archive_path: Path = None) -> "StreamSplitJob":
+        """
+        Start splitting an audio stream whose bytes are fed in as they arrive.
+
+        Args:
+            on_chunk: Optional async callback(chunk_info) called as soon as each
+                chunk is fully written, with the same dict split_audio returns.
+            archive_path: Also write the archival MP3 here from the same decode
+        """
+        job = StreamSplitJob(self, book_id, on_chunk, archive_path=archive_path)
+        await job.start()
+        return job
+
+    async def get_audio_duration(self, audio_path: Path, sha256: str = None) -> float:
         """Get the duration of an audio file in seconds."""
+        return (await self.probe(audio_path, sha256))["duration"]
+
+    async def probe(self, audio_path: Path, sha256: str = None) -> dict:
+        """
+        Probe an audio file, reusing the cached result for its content hash.
+
+        Returns {"duration", "format", "codec", "bitrate", "sample_rate",
+        "channels", "chapters": [{"start", "end", "title"}]}.
+        """
+        if sha256:
+            if sha256 in self._probes:
+                return self._probes[sha256]
+            if self.probe_store is not None:
+                cached = await self.probe_store.get_probe(sha256)
+                if cached is not None:
+                    self._probes[sha256] = cached
+                    return cached
+
+        result = await self._run_ffprobe(audio_path)
+        if sha256:
+            self._probes[sha256] = result
+            if self.probe_store is not None:
+                await self.probe_store.save_probe(sha256, result)
+        return result
+
+    async def _run_ffprobe(self, audio_path: Path) -> dict:
         cmd = [
             "ffprobe",
             "-v", "quiet",
             "-print_format", "json",
             "-show_format",
+            "-show_streams",
+            "-show_chapters",
             str(audio_path)
         ]
 
@@ -49,36 +207,106 @@ class AudioSplitter:
         stdout, _ = await proc.communicate()
 
         info = json.loads(stdout.decode())
-        return float(info["format"]["duration"])
+        fmt = info["format"]
+        audio = next((s for s in info.get("streams", []) if s.get("codec_type") == "audio"), {})
+        bitrate = audio.get("bit_rate") or fmt.get("bit_rate")
+        return {
+            "duration": float(fmt["duration"]),
+            "format": fmt.get("format_name"),
+            "codec": audio.get("codec_name"),
+            "bitrate": int(bitrate) if bitrate else None,
+            "sample_rate": int(audio["sample_rate"]) if audio.get("sample_rate") else None,
+            "channels": audio.get("channels"),
+            "chapters": [
+                {
+                    "start": float(ch["start_time"]),
+                    "end": float(ch["end_time"]),
+                    "title": ch.get("tags", {}).get("title"),
+                }
+                for ch in info.get("chapters", [])
+            ],
+        }
+
+    async def detect_silences(self, audio_path: Path) -> list[tuple[float, float]]:
+        """Return (start, end) of every pause, from one fast ffmpeg silencedetect pass."""
+        cmd = [
+            "ffmpeg",
+            "-nostats",
+            "-vn", "-sn",
+            "-i", str(audio_path),
+            "-af", f"aresample=8000,silencedetect=noise={self.silence_threshold_db}dB:d={self.min_silence}",
+            "-f", "null", "-",
+        ]
+
+        silences = []
+        start = None
+        async with self.scheduler.slot(PRIORITY_SPLIT):
+            proc = await asyncio.create_subprocess_exec(
+                *self.scheduler.command(cmd, PRIORITY_SPLIT),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            async for line in proc.stderr:
+                line = line.decode(errors="replace")
+                match = SILENCE_START_RE.search(line)
+                if match:
+                    start = max(float(match.group(1)), 0.0)
+                    continue
+                match = SILENCE_END_RE.search(line)
+                if match and start is not None:
+                    silences.append((start, float(match.group(1))))
+                    start = None
+            await proc.wait()
+
+        if proc.returncode != 0:
+            raise RuntimeError(f"Silence detection failed: {audio_path}")
+        if start is not None:
+            # Pause runs to the end of the file
+            silences.append((start, float("inf")))
+        return silences
+
+    async def plan_boundaries(self, audio_path: Path, duration: float) -> list[float]:
+        """Cut points for split_audio, aligned to pauses when boundary_window is set."""
+        silences = []
+        if self.boundary_window > 0:
+            try:
+                silences = await self.detect_silences(audio_path)
+            except RuntimeError as e:
+                print(f"[SPLIT] {e}; using fixed boundaries")
+        return plan_cut_points(duration, self.chunk_duration, silences, self.boundary_window)
 
     async def split_audio(self, audio_path: Path, book_id: str,
-                          progress_callback=None) -> list[dict]:
+                          progress_callback=None, archive_path: Path = None,
+                          sha256: str = None) -> list[dict]:
         """
         Split an audio file into chunks.
 
         Args:
             progress_callback: Optional async callback(current, total) called as each chunk completes.
+            archive_path: Also write the archival MP3 here from the same decode
+                (requires fuses_archive())
+            sha256: Content hash of audio_path, to reuse a cached probe
         Returns a list of chunk info dictionaries.
         """
-        duration = await self.get_audio_duration(audio_path)
+        if archive_path is not None and not self.fuses_archive():
+            raise ValueError("Archival output needs the segment engine without overlap")
+
+        duration = await self.get_audio_duration(audio_path, sha256)
         chunks = []
 
-        # Calculate number of chunks
-        num_chunks = int(duration // self.chunk_duration) + 1
+        # Cut points between chunks (every chunk_duration, or nudged to pauses)
+        cuts = await self.plan_boundaries(audio_path, duration)
+        bounds = [0] + cuts + [duration]
 
-        tasks = []
-        for i in range(num_chunks):
-            start_time = i * self.chunk_duration
-            end_time = min((i + 1) * self.chunk_duration, duration)
+        for i in range(len(bounds) - 1):
+            # Every chunk but the first starts `overlap` seconds early
+            start_time = max(bounds[i] - self.overlap, 0) if i > 0 else 0
+            end_time = max(bounds[i + 1], start_time)
 
             chunk_id = f"chunk_{i:04d}"
             chunk_filename = f"{book_id}_{chunk_id}.{self.audio_format}"
             chunk_path = self.output_dir / chunk_filename
 
-            tasks.append(self._extract_chunk(
-                audio_path, chunk_path, start_time, end_time - start_time
-            ))
-
             chunks.append({
                 "chunk_id": chunk_id,
                 "path": str(chunk_path),
@@ -88,60 +316,207 @@ class AudioSplitter:
                 "duration": end_time - start_time
             })
 
-        # Process chunks in parallel (limit concurrency)
-        semaphore = asyncio.Semaphore(4)
+        # The planned chunks come from the probed duration, which can be an
+        # overestimate (e.g. VBR MP3 without a Xing header), so only the chunks
+        # ffmpeg actually wrote are returned.
+        # The segment muxer can only produce back-to-back chunks
+        if self.engine == "segment" and self.overlap <= 0:
+            return await self._split_single_pass(audio_path, book_id, chunks, progress_callback,
+                                                 archive_path)
+        await self._split_per_chunk(audio_path, chunks, progress_callback)
+        return self._written_chunks(chunks)
+
+    def _written_chunks(self, chunks: list[dict]) -> list[dict]:
+        """Drop planned chunks past the real end of the audio; any other gap is an error."""
+        written = [c for c in chunks if Path(c["path"]).exists() and Path(c["path"]).stat().st_size > 0]
+        if not written or written != chunks[:len(written)]:
+            raise RuntimeError(f"Split produced {len(written)} of {len(chunks)} chunks, "
+                               f"not a prefix of the planned chunks")
+        for chunk in chunks[len(written):]:
+            Path(chunk["path"]).unlink(missing_ok=True)
+            print(f"[SPLIT] {chunk['filename']} is past the end of the audio; dropped")
+        return written
+
+    async def _split_per_chunk(self, audio_path: Path, chunks: list[dict],
+                               progress_callback=None):
+        """Extract each chunk with its own seeking ffmpeg process."""
         completed = [0]  # mutable for closure
 
-        async def limited_extract(task):
-            async with semaphore:
-                result = await task
-                completed[0] += 1
-                if progress_callback:
-                    await progress_callback(completed[0], num_chunks)
-                return result
+        # Process chunks in parallel, as many at a time as the scheduler allows
+        async def limited_extract(chunk):
+            async with self.scheduler.slot(PRIORITY_SPLIT):
+                await self._extract_chunk(audio_path, Path(chunk["path"]),
+                                          chunk["start"], chunk["duration"])
+            completed[0] += 1
+            if progress_callback:
+                await progress_callback(completed[0], len(chunks))
+
+        await asyncio.gather(*[limited_extract(c) for c in chunks])
+
+    async def _split_single_pass(self, audio_path: Path, book_id: str, chunks: list[dict],
+                                 progress_callback=None, archive_path: Path = None) -> list[dict]:
+        """
+        Decode the source once and write every chunk (and the archive) through one ffmpeg.
+
+        Returns the chunks from ffmpeg's segment list, with the times it cut
+        at; there may be fewer than planned.
+        """
+        completed = [0]  # mutable for closure
 
-        await asyncio.gather(*[limited_extract(t) for t in tasks])
+        async def on_chunk(_chunk):
+            completed[0] += 1
+            if progress_callback:
+                await progress_callback(completed[0], len(chunks))
 
-        return chunks
+        job = StreamSplitJob(self, book_id, on_chunk, source=audio_path,
+                             segment_times=[c["start"] for c in chunks[1:]],
+                             archive_path=archive_path)
+        async with self.scheduler.slot(PRIORITY_SPLIT):
+            await job.start()
+            try:
+                return await job.finish()
+            except BaseException:
+                await job.abort()
+                raise
 
     async def _extract_chunk(self, input_path: Path, output_path: Path,
                              start: float, duration: float):
         """Extract a chunk from the audio file."""
-        # Base command
         cmd = [
             "ffmpeg",
             "-y",  # Overwrite output
             "-ss", str(start),  # Seek before input (faster)
             "-i", str(input_path),
             "-t", str(duration),
-            "-ar", "16000",  # 16kHz sample rate (optimal for Whisper)
-            "-ac", "1",  # Mono
+            *self._encode_args(),
+            str(output_path),
         ]
 
-        # Format-specific encoding
-        if self.audio_format == "mp3":
-            cmd.extend([
-                "-c:a", "libmp3lame",
-                "-b:a", self.bitrate,  # e.g., "48k" - good for speech
-            ])
-        elif self.audio_format == "opus":
-            cmd.extend([
-                "-c:a", "libopus",
-                "-b:a", self.bitrate,
-            ])
-        else:  # wav (fallback)
-            cmd.extend([
-                "-c:a", "pcm_s16le",  # 16-bit PCM
-            ])
-
-        cmd.append(str(output_path))
-
         proc = await asyncio.create_subprocess_exec(
-            *cmd,
+            *self.scheduler.command(cmd, PRIORITY_SPLIT),
             stdout=asyncio.subprocess.DEVNULL,
-            stderr=asyncio.subprocess.DEVNULL
+            stderr=asyncio.subprocess.PIPE
         )
-        await proc.communicate()
+        _, stderr = await proc.communicate()
 
         if proc.returncode != 0:
             raise RuntimeError(f"Failed to extract chunk: {output_path}")
+        if b"Output file is empty" in stderr:
+            # Started past the real end of the audio: only headers were written
+            output_path.unlink(missing_ok=True)
+
+
+class StreamSplitJob:
+    """
+    One ffmpeg process that decodes the source once (from stdin, or from a
+    file) and cuts it with the segment muxer. ffmpeg reports each finished
+    segment on stdout through a CSV segment list, so chunks become available
+    while the upload is still being received.
+    """
+
+    def __init__(self, splitter: AudioSplitter, book_id: str, on_chunk=None,
+                 source: Path = None, segment_times: list[float] = None,
+                 archive_path: Path = None):
+        """
+        Args:
+            source: Read this file instead of bytes passed to feed()
+            segment_times: Explicit cut points in seconds instead of every chunk_duration
+            archive_path: Also encode the archival MP3 here from the same decoded audio
+        """
+        self.splitter = splitter
+        self.book_id = book_id
+        self.on_chunk = on_chunk
+        self.source = source
+        self.segment_times = segment_times
+        self.archive_path = archive_path
+        self.chunks: list[dict] = []
+        self.failed = False
+        self.proc = None
+        self._reader = None
+
+    async def start(self):
+        pattern = self.splitter.output_dir / f"{self.book_id}_chunk_%04d.{self.splitter.audio_format}"
+        if self.segment_times is not None:
+            cut_args = ["-segment_times", ",".join(str(t) for t in self.segment_times)]
+        else:
+            cut_args = ["-segment_time", str(self.splitter.chunk_duration)]
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-i", str(self.source) if self.source else "pipe:0",
+        ]
+        if self.archive_path:
+            # Second output fed from the same decoder (no second decode pass)
+            cmd += ["-vn", *ARCHIVE_ENCODE_ARGS, str(self.archive_path)]
+        cmd += [
+            "-vn",
+            *self.splitter._encode_args(),
+            "-f", "segment",
+            *cut_args,
+            "-reset_timestamps", "1",
+            "-segment_list", "pipe:1",
+            "-segment_list_type", "csv",
+            str(pattern),
+        ]
+        # Streaming jobs mostly wait on the network, so they run niced but do
+        # not occupy a scheduler slot
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.splitter.scheduler.command(cmd, PRIORITY_SPLIT),
+            stdin=asyncio.subprocess.DEVNULL if self.source else asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        self._reader = asyncio.create_task(self._read_segments())
+
+    async def _read_segments(self):
+        """Turn each segment-list line ("file,start,end") into a chunk manifest entry."""
+        async for line in self.proc.stdout:
+            line = line.decode(errors="replace").strip()
+            if not line:
+                continue
+            name, start, end = line.rsplit(",", 2)
+            chunk_filename = Path(name.strip('"')).name
+            start_time, end_time = float(start), float(end)
+            chunk = {
+                "chunk_id": Path(chunk_filename).stem[len(self.book_id) + 1:],
+                "path": str(self.splitter.output_dir / chunk_filename),
+                "filename": chunk_filename,
+                "start": start_time,
+                "end": end_time,
+                "duration": end_time - start_time
+            }
+            self.chunks.append(chunk)
+            if self.on_chunk:
+                await self.on_chunk(chunk)
+
+    async def feed(self, data: bytes):
+        """Pass the next block of the source file to ffmpeg."""
+        if self.failed:
+            return
+        try:
+            self.proc.stdin.write(data)
+            await self.proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg gave up on the input; finish() reports the failure
+            self.failed = True
+
+    async def finish(self) -> list[dict]:
+        """Close the input and wait for the remaining chunks."""
+        if self.proc.stdin:
+            try:
+                self.proc.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        await self.proc.wait()
+        await self._reader
+        if self.failed or self.proc.returncode != 0 or not self.chunks:
+            raise RuntimeError(f"Streaming split failed for book {self.book_id}")
+        return self.chunks
+
+    async def abort(self):
+        """Stop ffmpeg without waiting for the remaining input."""
+        if self.proc and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+        if self._reader:
+            self._reader.cancel()
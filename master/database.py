@@ -4,23 +4,132 @@ SQLite database for task management.
 
 import json
 import sqlite3
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 
 
+# Applied to every connection when it is opened. WAL lets the dashboard and
+# status readers run alongside task writes, and synchronous=NORMAL only
+# fsyncs on checkpoint instead of on every commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",  # 16 MB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Book orderings for claim_next_task, applied within the highest book priority.
+# They rank books using the book_load CTE (upload order, chunks in flight and
+# audio seconds left per book).
+#   fifo: finish books in upload order
+#   fair: hand the next chunk to the book with the fewest chunks in flight
+#         per unit of weight, so concurrent books share workers by weight
+#   srpt: shortest remaining audio first (minimises mean completion time)
+SCHEDULING_POLICIES = {
+    "fifo": "l.first_seq",
+    "fair": "(l.running + 1.0) / COALESCE(b.weight, 1), l.first_seq",
+    "srpt": "l.remaining, l.first_seq",
+}
+
+# Workers whose real-time factor (processing seconds per audio second) is
+# more than this many times the fastest active worker's count as slow
+SLOW_WORKER_RATIO = 2.0
+RTF_SMOOTHING = 0.3  # Weight of the newest chunk in a worker's observed RTF
+
+# An idle worker gets a speculative copy of one of a book's last outstanding
+# chunks if it would finish sooner than the holder, or the holder has run
+# STRAGGLER_FACTOR times longer than its RTF predicts.
+STRAGGLER_FACTOR = 1.5
+
+# Seconds a task has been running, and the RTF of the worker holding it
+ELAPSED_SQL = "(julianday(:now) - julianday(t.started_at)) * 86400"
+HOLDER_RTF_SQL = "COALESCE(hw.observed_rtf, hw.rtf)"
+
+# Cached transcripts are indexed by fixed slices ("bands") of their audio
+# fingerprint, so a lookup only compares entries sharing at least one band
+# instead of every entry of the same duration. Two fingerprints 10% apart
+# still share one of 64 16-bit bands with near certainty.
+FINGERPRINT_BAND_BITS = 16
+MAX_FINGERPRINT_BANDS = 64
+
+
+def fingerprint_bands(fingerprint: str) -> list[tuple[int, str]]:
+    """(band index, bits) for each whole band at the start of a fingerprint."""
+    count = min(len(fingerprint) // FINGERPRINT_BAND_BITS, MAX_FINGERPRINT_BANDS)
+    return [(i, fingerprint[i * FINGERPRINT_BAND_BITS:(i + 1) * FINGERPRINT_BAND_BITS])
+            for i in range(count)]
+
+
+# Oldest book with a given content hash (excluding one book_id) and its progress
+BOOK_BY_HASH_SQL = """
+    SELECT b.book_id, b.original_filename,
+           COUNT(t.id) as total_chunks,
+           COALESCE(SUM(CASE WHEN t.status = 'completed' THEN 1 ELSE 0 END), 0)
+               as completed_chunks
+    FROM books b
+    LEFT JOIN tasks t ON t.book_id = b.book_id
+    WHERE b.sha256 = ? AND b.book_id != ?
+    GROUP BY b.book_id
+    ORDER BY b.created_at
+    LIMIT 1
+"""
+
+
 class Database:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, policy: str = "fair", speculate_last_n: int = 2,
+                 lease_ttl: float = 90):
+        """
+        Args:
+            db_path: SQLite file (default: stt_tasks.db in the repo root)
+            policy: Task scheduling policy, one of SCHEDULING_POLICIES
+            speculate_last_n: Books with at most this many unfinished chunks get
+                speculative copies of stragglers (0 = never speculate)
+            lease_ttl: Seconds a task lease lasts without renewal
+        """
+        self.speculate_last_n = speculate_last_n
+        self.lease_ttl = lease_ttl
         if db_path is None:
             db_path = Path(__file__).parent.parent / "stt_tasks.db"
         self.db_path = db_path
+        # One long-lived connection per thread; sqlite3 connections must not
+        # be shared across threads while a statement is in flight.
+        self._local = threading.local()
+        self._all_conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self.set_scheduling_policy(policy)
         self._init_db()
 
     def _get_conn(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=10.0,
+                check_same_thread=False,
+                cached_statements=256,  # reuse prepared statements
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._all_conns.append(conn)
         return conn
 
+    def close(self):
+        """Close every pooled connection (call on shutdown)."""
+        with self._conns_lock:
+            for conn in self._all_conns:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all_conns.clear()
+        self._local = threading.local()
+
     def _init_db(self):
         conn = self._get_conn()
         conn.executescript("""
@@ -45,7 +154,11 @@ class Database:
                 worker_id TEXT PRIMARY KEY,
                 hostname TEXT,
                 registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_heartbeat TIMESTAMP
+                last_heartbeat TIMESTAMP,
+                hardware TEXT,
+                model TEXT,
+                rtf REAL,
+                observed_rtf REAL
             );
 
             CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
@@ -55,7 +168,9 @@ class Database:
                 book_id TEXT PRIMARY KEY,
                 original_filename TEXT,
                 paused INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                priority INTEGER DEFAULT 0,
+                weight REAL DEFAULT 1
             );
 
             CREATE TABLE IF NOT EXISTS activity_logs (
@@ -66,80 +181,422 @@ class Database:
             );
 
             CREATE INDEX IF NOT EXISTS idx_logs_created ON activity_logs(created_at);
+
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                upload_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS transcript_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fingerprint TEXT NOT NULL,
+                duration REAL NOT NULL,
+                profile TEXT NOT NULL,
+                transcript TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_transcript_cache_lookup
+                ON transcript_cache(profile, duration);
+            CREATE INDEX IF NOT EXISTS idx_transcript_cache_used
+                ON transcript_cache(last_used);
+
+            CREATE TABLE IF NOT EXISTS transcript_cache_bands (
+                band INTEGER NOT NULL,
+                bits TEXT NOT NULL,
+                entry_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bits, entry_id)
+            ) WITHOUT ROWID;
+
+            CREATE INDEX IF NOT EXISTS idx_transcript_cache_bands_entry
+                ON transcript_cache_bands(entry_id);
+
+            -- A worker's claim on a task. The token is a fencing token: it only
+            -- ever grows, and a completion must present a lease still on record.
+            CREATE TABLE IF NOT EXISTS task_leases (
+                token INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                worker_id TEXT NOT NULL,
+                expires_at TIMESTAMP NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_leases_task ON task_leases(task_id);
+            CREATE INDEX IF NOT EXISTS idx_leases_worker ON task_leases(worker_id);
+            CREATE INDEX IF NOT EXISTS idx_leases_expiry ON task_leases(expires_at);
+
+            CREATE TABLE IF NOT EXISTS probe_cache (
+                sha256 TEXT PRIMARY KEY,
+                probe TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
         """)
+        # Columns added after the first release
+        book_columns = {row[1] for row in conn.execute("PRAGMA table_info(books)")}
+        if "sha256" not in book_columns:
+            conn.execute("ALTER TABLE books ADD COLUMN sha256 TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_books_sha256 ON books(sha256)")
+        task_columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if "fingerprint" not in task_columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN fingerprint TEXT")
+        for column, kind in (("chunk_sha256", "TEXT"), ("chunk_size", "INTEGER")):
+            if column not in task_columns:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {kind}")
+        worker_columns = {row[1] for row in conn.execute("PRAGMA table_info(workers)")}
+        for column, kind in (("hardware", "TEXT"), ("model", "TEXT"),
+                             ("rtf", "REAL"), ("observed_rtf", "REAL")):
+            if column not in worker_columns:
+                conn.execute(f"ALTER TABLE workers ADD COLUMN {column} {kind}")
+        if "priority" not in book_columns:
+            conn.execute("ALTER TABLE books ADD COLUMN priority INTEGER DEFAULT 0")
+        if "weight" not in book_columns:
+            conn.execute("ALTER TABLE books ADD COLUMN weight REAL DEFAULT 1")
+        # Index cache entries stored before fingerprint bands existed
+        unindexed = conn.execute("""
+            SELECT id, fingerprint FROM transcript_cache
+            WHERE id NOT IN (SELECT entry_id FROM transcript_cache_bands)
+        """).fetchall()
+        for row in unindexed:
+            self._index_fingerprint(conn, row["id"], row["fingerprint"])
         conn.commit()
-        conn.close()
 
     def create_task(self, book_id: str, chunk_id: str, chunk_path: str,
-                    start_time: float, end_time: float, original_filename: str):
+                    start_time: float, end_time: float, original_filename: str,
+                    chunk_sha256: str = None, chunk_size: int = None,
+                    fingerprint: str = None):
         conn = self._get_conn()
         task_id = f"{book_id}_{chunk_id}"
         conn.execute("""
-            INSERT INTO tasks (id, book_id, chunk_id, chunk_path, start_time, end_time, original_filename)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (task_id, book_id, chunk_id, chunk_path, start_time, end_time, original_filename))
+            INSERT INTO tasks (id, book_id, chunk_id, chunk_path, start_time, end_time,
+                               original_filename, chunk_sha256, chunk_size, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (task_id, book_id, chunk_id, chunk_path, start_time, end_time, original_filename,
+              chunk_sha256, chunk_size, fingerprint))
         conn.commit()
-        conn.close()
         return task_id
 
-    def get_next_pending_task(self) -> Optional[dict]:
+    def set_scheduling_policy(self, policy: str):
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.scheduling_policy = policy
+
+    def claim_next_task(self, worker_id: str, queued: bool = False,
+                        speculate: bool = True) -> Optional[dict]:
+        """
+        Atomically pick the next runnable task and assign it to a worker.
+
+        Books with a higher priority go first, then the scheduling policy
+        decides. The worker gets a lease on the task (returned as lease_token
+        and lease_expires_at) that its heartbeats must renew; expired leases
+        are reclaimed by expire_leases. Selection and assignment happen under
+        BEGIN IMMEDIATE, so concurrent callers never receive the same task.
+
+        Args:
+            queued: The task goes to the worker's local queue; started_at stays
+                empty until start_task, so waiting is not mistaken for straggling
+            speculate: Fall back to a speculative copy if nothing is pending
+
+        Fast workers take a book's longest chunks first, slow ones its
+        shortest, and slow workers leave each book's last pending chunks
+        (its critical path) to fast workers; see _speed_limits.
+
+        With nothing else to do, the worker may get a speculative copy of a
+        straggling chunk (returned with "speculative": True); both workers
+        then hold the task and complete_task keeps the first result.
+        """
+        order = SCHEDULING_POLICIES[self.scheduling_policy]
         conn = self._get_conn()
-        # Also recover stale tasks (assigned but not completed for > 10 min)
-        stale_threshold = datetime.now() - timedelta(minutes=10)
-
-        # First try to get a pending task (excluding paused books)
-        row = conn.execute("""
-            SELECT t.* FROM tasks t
-            LEFT JOIN books b ON t.book_id = b.book_id
-            WHERE t.status = 'pending' AND COALESCE(b.paused, 0) = 0
-            ORDER BY t.book_id, t.start_time LIMIT 1
-        """).fetchone()
-
-        if not row:
-            # Try to recover a stale in-progress task (excluding paused books)
-            row = conn.execute("""
-                SELECT t.* FROM tasks t
-                LEFT JOIN books b ON t.book_id = b.book_id
-                WHERE t.status = 'in_progress' AND t.started_at < ?
-                AND COALESCE(b.paused, 0) = 0
-                ORDER BY t.book_id, t.start_time LIMIT 1
-            """, (stale_threshold,)).fetchone()
-
-        conn.close()
-        return dict(row) if row else None
-
-    def assign_task(self, task_id: str, worker_id: str):
+        now = datetime.now()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            limits = self._speed_limits(conn, worker_id)
+            rows = conn.execute(f"""
+                WITH book_load AS (
+                    SELECT book_id,
+                           MIN(rowid) AS first_seq,
+                           SUM(status = 'in_progress') AS running,
+                           SUM(CASE WHEN status = 'pending'
+                                    THEN end_time - start_time ELSE 0 END) AS pending_audio,
+                           SUM(CASE WHEN status != 'completed'
+                                    THEN end_time - start_time ELSE 0 END) AS remaining
+                    FROM tasks
+                    WHERE book_id IN (SELECT book_id FROM tasks WHERE status != 'completed')
+                    GROUP BY book_id
+                )
+                UPDATE tasks SET status = 'in_progress', worker_id = :worker_id,
+                    started_at = CASE WHEN :queued THEN NULL ELSE :now END
+                WHERE id = (
+                    SELECT t.id FROM tasks t
+                    JOIN book_load l ON l.book_id = t.book_id
+                    LEFT JOIN books b ON t.book_id = b.book_id
+                    WHERE COALESCE(b.paused, 0) = 0
+                    AND t.status = 'pending'
+                    AND (NOT :slow
+                         OR (t.end_time - t.start_time) * :rtf
+                            <= :fast_eta + (l.pending_audio - (t.end_time - t.start_time)) * :fast_rate)
+                    ORDER BY COALESCE(b.priority, 0) DESC, {order},
+                             (t.end_time - t.start_time) * :size_order, t.start_time
+                    LIMIT 1
+                )
+                RETURNING *
+            """, {"worker_id": worker_id, "now": now, "queued": queued, **limits}).fetchall()
+            speculative = False
+            if not rows and speculate and self.speculate_last_n > 0:
+                rows = self._claim_speculative(conn, worker_id, now)
+                speculative = True
+            task = None
+            if rows:
+                task = {**dict(rows[0]), **self._grant_lease(conn, rows[0]["id"], worker_id, now)}
+                if speculative:
+                    task["speculative"] = True
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return task
+
+    def _grant_lease(self, conn, task_id: str, worker_id: str, now: datetime) -> dict:
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+        token = conn.execute("""
+            INSERT INTO task_leases (task_id, worker_id, expires_at) VALUES (?, ?, ?)
+        """, (task_id, worker_id, expires_at)).lastrowid
+        return {"lease_token": token, "lease_expires_at": expires_at.isoformat(),
+                "lease_ttl": self.lease_ttl}
+
+    def renew_leases(self, worker_id: str, task_id: str = None) -> list[dict]:
+        """
+        Extend a worker's leases (or just the one on task_id) by lease_ttl.
+
+        Returns the worker's live leases as [{"task_id", "lease_token"}]; a
+        task missing from the list was lost and should be abandoned.
+        """
         conn = self._get_conn()
+        expires_at = datetime.now() + timedelta(seconds=self.lease_ttl)
         conn.execute("""
-            UPDATE tasks SET status = 'in_progress', worker_id = ?, started_at = ?
-            WHERE id = ?
-        """, (worker_id, datetime.now(), task_id))
+            UPDATE task_leases SET expires_at = ?
+            WHERE worker_id = ? AND (? IS NULL OR task_id = ?)
+        """, (expires_at, worker_id, task_id, task_id))
         conn.commit()
-        conn.close()
+        rows = conn.execute(
+            "SELECT task_id, token FROM task_leases WHERE worker_id = ?", (worker_id,)
+        ).fetchall()
+        return [{"task_id": row["task_id"], "lease_token": row["token"]} for row in rows]
 
-    def complete_task(self, task_id: str, worker_id: str, transcript: dict, processing_time: float):
+    def start_task(self, task_id: str, worker_id: str):
+        """Record that a worker began a task it had queued, and renew its lease."""
         conn = self._get_conn()
         conn.execute("""
-            UPDATE tasks SET
-                status = 'completed',
-                transcript = ?,
-                processing_time = ?,
-                completed_at = ?
-            WHERE id = ?
-        """, (json.dumps(transcript), processing_time, datetime.now(), task_id))
+            UPDATE tasks SET started_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'in_progress' AND started_at IS NULL
+        """, (datetime.now(), task_id, worker_id))
         conn.commit()
-        conn.close()
+        self.renew_leases(worker_id, task_id)
+
+    def release_tasks(self, worker_id: str, task_ids: list[str]) -> list[str]:
+        """
+        Give up a worker's leases on tasks it will not run (e.g. on shutdown).
+
+        Tasks nobody else holds go back to pending. Returns the released task ids.
+        """
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            released = conn.execute(f"""
+                DELETE FROM task_leases
+                WHERE worker_id = ? AND task_id IN ({",".join("?" * len(task_ids))})
+                RETURNING task_id
+            """, (worker_id, *task_ids)).fetchall()
+            if released:
+                self._requeue_unleased(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return [row["task_id"] for row in released]
+
+    def _requeue_unleased(self, conn):
+        conn.execute("""
+            UPDATE tasks SET status = 'pending', worker_id = NULL, started_at = NULL
+            WHERE status = 'in_progress'
+            AND id NOT IN (SELECT task_id FROM task_leases)
+        """)
+
+    def expire_leases(self) -> list[dict]:
+        """
+        Drop expired leases and put tasks nobody holds any more back to pending.
+
+        Returns the dropped leases as [{"task_id", "worker_id", "lease_token"}].
+        """
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute("""
+                DELETE FROM task_leases WHERE expires_at < ?
+                RETURNING task_id, worker_id, token
+            """, (datetime.now(),)).fetchall()
+            if expired:
+                self._requeue_unleased(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return [{"task_id": row["task_id"], "worker_id": row["worker_id"],
+                 "lease_token": row["token"]} for row in expired]
+
+    def _claim_speculative(self, conn, worker_id: str, now: datetime) -> list:
+        """Pick a straggler among books' last chunks for this worker to run a second copy of."""
+        rtf = conn.execute(
+            "SELECT COALESCE(observed_rtf, rtf) FROM workers WHERE worker_id = ?", (worker_id,)
+        ).fetchone()
+        duration = "(t.end_time - t.start_time)"
+        # Seconds the holder still needs by its RTF (negative once overdue)
+        remaining = f"{HOLDER_RTF_SQL} * {duration} - {ELAPSED_SQL}"
+        return conn.execute(f"""
+            SELECT t.* FROM tasks t
+            JOIN (
+                SELECT book_id, SUM(status != 'completed') AS outstanding FROM tasks
+                WHERE book_id IN (SELECT book_id FROM tasks WHERE status = 'in_progress')
+                GROUP BY book_id
+            ) o ON o.book_id = t.book_id
+            LEFT JOIN books b ON t.book_id = b.book_id
+            LEFT JOIN workers hw ON hw.worker_id = t.worker_id
+            WHERE t.status = 'in_progress'
+            -- Only the original holder: at most one speculative copy
+            AND (SELECT COUNT(*) FROM task_leases WHERE task_id = t.id) = 1
+            AND NOT EXISTS (SELECT 1 FROM task_leases
+                            WHERE task_id = t.id AND worker_id = :worker_id)
+            AND COALESCE(b.paused, 0) = 0
+            AND o.outstanding <= :last_n
+            AND ({remaining} > :my_rtf * {duration}
+                 OR {ELAPSED_SQL} > :straggler_factor * {HOLDER_RTF_SQL} * {duration})
+            ORDER BY {ELAPSED_SQL} > :straggler_factor * {HOLDER_RTF_SQL} * {duration} DESC,
+                     {remaining} DESC
+            LIMIT 1
+        """, {"worker_id": worker_id, "now": now, "last_n": self.speculate_last_n,
+              "my_rtf": rtf[0] if rtf else None,
+              "straggler_factor": STRAGGLER_FACTOR}).fetchall()
+
+    def _speed_limits(self, conn, worker_id: str) -> dict:
+        """
+        How claim_next_task should treat this worker, from real-time factors.
+
+        A worker is slow when its RTF is over SLOW_WORKER_RATIO times the
+        fastest active worker's. A slow worker only takes a chunk it will
+        finish before the fast workers could get through the rest of that
+        book's pending audio:
+            rtf * duration <= fast_eta + (pending_audio - duration) * fast_rate
+        where fast_eta is how soon the first fast worker gets through the
+        chunks it holds (including its local queue) and
+        fast_rate the fast workers' combined seconds per audio second, so it
+        never ends up holding a book's merge. Workers with no RTF yet are
+        treated as fast.
+        """
+        threshold = datetime.now() - timedelta(minutes=2)
+        workers = {
+            row["worker_id"]: row["rtf"]
+            for row in conn.execute("""
+                SELECT worker_id, COALESCE(observed_rtf, rtf) AS rtf FROM workers
+                WHERE last_heartbeat > ? OR worker_id = ?
+            """, (threshold, worker_id))
+        }
+        rtf = workers.get(worker_id)
+        known = [r for r in workers.values() if r]
+        fastest = min(known, default=None)
+        neutral = {"slow": 0, "rtf": 0, "fast_eta": 0, "fast_rate": 0, "size_order": 0}
+        if not rtf or not fastest:
+            return neutral
+        if rtf > SLOW_WORKER_RATIO * fastest:
+            fast = {w: r for w, r in workers.items() if r and r <= SLOW_WORKER_RATIO * fastest}
+            busy_until = {w: 0.0 for w in fast}  # Seconds of work each fast worker holds
+            now = datetime.now()
+            for row in conn.execute(f"""
+                SELECT worker_id, started_at, end_time - start_time AS duration FROM tasks
+                WHERE status = 'in_progress'
+                AND worker_id IN ({",".join("?" * len(fast))})
+            """, list(fast)):
+                elapsed = 0.0
+                if row["started_at"]:  # Not yet started if still queued
+                    elapsed = (now - datetime.fromisoformat(str(row["started_at"]))).total_seconds()
+                left = max(0.0, fast[row["worker_id"]] * row["duration"] - elapsed)
+                busy_until[row["worker_id"]] += left
+            return {
+                "slow": 1,
+                "rtf": rtf,
+                "fast_eta": min(busy_until.values()),
+                "fast_rate": 1 / sum(1 / r for r in fast.values()),
+                "size_order": 1,  # Shortest chunks first
+            }
+        return {**neutral, "size_order": -1}  # Longest chunks first
+
+    def complete_task(self, task_id: str, worker_id: str, transcript: dict,
+                      processing_time: float, lease_token: int) -> dict:
+        """
+        Store a chunk's transcript if the worker still holds a lease on it.
+
+        Args:
+            lease_token: Fencing token from claim_next_task.
+        Returns {"won": bool, "fenced": bool, "cancel": [worker_id]}: whether
+        this result was kept, whether it was refused because the lease had
+        expired and the task was not finished by anyone else, and the workers still running the
+        chunk (speculative copies), which should be told to stop.
+        """
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("""
+                SELECT 1 FROM task_leases WHERE token = ? AND task_id = ? AND worker_id = ?
+            """, (lease_token, task_id, worker_id)).fetchone() is None:
+                done = conn.execute(
+                    "SELECT 1 FROM tasks WHERE id = ? AND status = 'completed'", (task_id,)
+                ).fetchone()
+                conn.rollback()
+                # Losing a race to another copy is not an eviction
+                return {"won": False, "fenced": done is None, "cancel": []}
+            won = conn.execute("""
+                UPDATE tasks SET
+                    status = 'completed',
+                    worker_id = ?,
+                    transcript = ?,
+                    processing_time = ?,
+                    completed_at = ?
+                WHERE id = ? AND status != 'completed'
+            """, (worker_id, json.dumps(transcript), processing_time, datetime.now(),
+                  task_id)).rowcount == 1
+            others = conn.execute("""
+                DELETE FROM task_leases WHERE task_id = ? RETURNING worker_id
+            """, (task_id,)).fetchall()
+            self._record_rtf(conn, task_id, worker_id, processing_time)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return {"won": won, "fenced": False,
+                "cancel": [row[0] for row in others if row[0] != worker_id]}
+
+    def _record_rtf(self, conn, task_id: str, worker_id: str, processing_time: float):
+        """Fold one chunk's processing time into the worker's observed RTF."""
+        row = conn.execute(
+            "SELECT end_time - start_time FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        if row and row[0] > 0 and processing_time > 0:
+            # Track the worker's real-time factor (moving average over its chunks)
+            conn.execute("""
+                UPDATE workers SET observed_rtf = CASE
+                    WHEN observed_rtf IS NULL THEN :rtf
+                    ELSE observed_rtf * (1 - :alpha) + :rtf * :alpha END
+                WHERE worker_id = :worker
+            """, {"rtf": processing_time / row[0], "alpha": RTF_SMOOTHING, "worker": worker_id})
 
     def get_task(self, task_id: str) -> Optional[dict]:
         conn = self._get_conn()
         row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-        conn.close()
         return dict(row) if row else None
 
     def get_all_tasks(self) -> list[dict]:
         conn = self._get_conn()
         rows = conn.execute("SELECT * FROM tasks ORDER BY book_id, start_time").fetchall()
-        conn.close()
         return [dict(row) for row in rows]
 
     def get_book_tasks(self, book_id: str) -> list[dict]:
@@ -148,7 +605,6 @@ class Database:
             "SELECT * FROM tasks WHERE book_id = ? ORDER BY start_time",
             (book_id,)
         ).fetchall()
-        conn.close()
         return [dict(row) for row in rows]
 
     def get_book_status(self, book_id: str) -> dict:
@@ -164,7 +620,6 @@ class Database:
             "SELECT COUNT(*) FROM tasks WHERE book_id = ? AND status = 'in_progress'",
             (book_id,)
         ).fetchone()[0]
-        conn.close()
         return {
             "total": total,
             "completed": completed,
@@ -179,7 +634,6 @@ class Database:
         completed = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'completed'").fetchone()[0]
         in_progress = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'in_progress'").fetchone()[0]
         pending = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'").fetchone()[0]
-        conn.close()
         return {
             "total": total,
             "completed": completed,
@@ -195,13 +649,14 @@ class Database:
                    COUNT(*) as total_chunks,
                    SUM(CASE WHEN t.status = 'completed' THEN 1 ELSE 0 END) as completed_chunks,
                    MIN(t.created_at) as created_at,
-                   COALESCE(b.paused, 0) as paused
+                   COALESCE(b.paused, 0) as paused,
+                   COALESCE(b.priority, 0) as priority,
+                   COALESCE(b.weight, 1) as weight
             FROM tasks t
             LEFT JOIN books b ON t.book_id = b.book_id
             GROUP BY t.book_id
             ORDER BY t.created_at DESC
         """).fetchall()
-        conn.close()
         return [dict(row) for row in rows]
 
     def create_book(self, book_id: str, original_filename: str):
@@ -212,7 +667,57 @@ class Database:
             VALUES (?, ?)
         """, (book_id, original_filename))
         conn.commit()
-        conn.close()
+
+    def find_book_by_hash(self, sha256: str) -> Optional[dict]:
+        """The book holding this content hash, with its chunk counts."""
+        conn = self._get_conn()
+        row = conn.execute(BOOK_BY_HASH_SQL, (sha256, "")).fetchone()
+        return dict(row) if row else None
+
+    def claim_book_hash(self, book_id: str, original_filename: str,
+                        sha256: str) -> Optional[dict]:
+        """
+        Register a book by content hash unless another book already has it.
+
+        Returns the existing book (book_id, original_filename, total_chunks,
+        completed_chunks) if the hash is taken, otherwise records this book
+        and returns None. Check and insert run under BEGIN IMMEDIATE, so two
+        concurrent uploads of the same audio cannot both claim it.
+        """
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(BOOK_BY_HASH_SQL, (sha256, book_id)).fetchone()
+            if row is None:
+                conn.execute("""
+                    INSERT INTO books (book_id, original_filename, sha256) VALUES (?, ?, ?)
+                    ON CONFLICT(book_id) DO UPDATE SET
+                        original_filename = excluded.original_filename,
+                        sha256 = excluded.sha256
+                """, (book_id, original_filename, sha256))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return dict(row) if row else None
+
+    def set_book_priority(self, book_id: str, priority: int = None, weight: float = None) -> bool:
+        """
+        Set a book's scheduling priority (higher runs first) and/or fair-share
+        weight. Returns False if there is no such book.
+        """
+        conn = self._get_conn()
+        cursor = conn.execute("""
+            INSERT INTO books (book_id, priority, weight)
+            SELECT ?, COALESCE(?, 0), COALESCE(?, 1)
+            WHERE EXISTS (SELECT 1 FROM books WHERE book_id = ?)
+               OR EXISTS (SELECT 1 FROM tasks WHERE book_id = ?)
+            ON CONFLICT(book_id) DO UPDATE SET
+                priority = COALESCE(?, priority),
+                weight = COALESCE(?, weight)
+        """, (book_id, priority, weight, book_id, book_id, priority, weight))
+        conn.commit()
+        return cursor.rowcount > 0
 
     def pause_book(self, book_id: str):
         """Pause processing of a book."""
@@ -222,14 +727,12 @@ class Database:
             ON CONFLICT(book_id) DO UPDATE SET paused = 1
         """, (book_id,))
         conn.commit()
-        conn.close()
 
     def resume_book(self, book_id: str):
         """Resume processing of a book."""
         conn = self._get_conn()
         conn.execute("UPDATE books SET paused = 0 WHERE book_id = ?", (book_id,))
         conn.commit()
-        conn.close()
 
     def delete_book(self, book_id: str) -> list[str]:
         """Delete a book and all its tasks. Returns list of chunk paths to delete."""
@@ -240,18 +743,19 @@ class Database:
         ).fetchall()
         chunk_paths = [row[0] for row in rows]
         
-        # Delete tasks and book
+        # Delete tasks, their leases and book
+        conn.execute("""
+            DELETE FROM task_leases WHERE task_id IN (SELECT id FROM tasks WHERE book_id = ?)
+        """, (book_id,))
         conn.execute("DELETE FROM tasks WHERE book_id = ?", (book_id,))
         conn.execute("DELETE FROM books WHERE book_id = ?", (book_id,))
         conn.commit()
-        conn.close()
         return chunk_paths
         
     def check_book_exists(self, filename: str) -> bool:
         """Check if a book with the given original filename already exists."""
         conn = self._get_conn()
         row = conn.execute("SELECT 1 FROM books WHERE original_filename = ?", (filename,)).fetchone()
-        conn.close()
         return row is not None
 
     def delete_all_books(self) -> list[str]:
@@ -263,10 +767,11 @@ class Database:
         chunk_paths = [row[0] for row in rows]
         
         # Wipe the tables
+        conn.execute("DELETE FROM task_leases")
         conn.execute("DELETE FROM tasks")
         conn.execute("DELETE FROM books")
+        conn.execute("DELETE FROM upload_sessions")
         conn.commit()
-        conn.close()
         return chunk_paths
 
     def is_book_paused(self, book_id: str) -> bool:
@@ -275,17 +780,126 @@ class Database:
         row = conn.execute(
             "SELECT paused FROM books WHERE book_id = ?", (book_id,)
         ).fetchone()
-        conn.close()
         return row[0] == 1 if row else False
 
-    def register_worker(self, worker_id: str, hostname: str):
+    def create_upload_session(self, upload_id: str, filename: str, size: int):
+        """Record a resumable upload session."""
+        conn = self._get_conn()
+        conn.execute("""
+            INSERT INTO upload_sessions (upload_id, filename, size) VALUES (?, ?, ?)
+        """, (upload_id, filename, size))
+        conn.commit()
+
+    def get_upload_session(self, upload_id: str) -> Optional[dict]:
+        conn = self._get_conn()
+        row = conn.execute(
+            "SELECT * FROM upload_sessions WHERE upload_id = ?", (upload_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def delete_upload_session(self, upload_id: str):
+        conn = self._get_conn()
+        conn.execute("DELETE FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+        conn.commit()
+
+    def get_expired_upload_sessions(self, max_age: float) -> list[dict]:
+        """Upload sessions created more than max_age seconds ago."""
+        conn = self._get_conn()
+        rows = conn.execute("""
+            SELECT * FROM upload_sessions WHERE created_at < datetime('now', ?)
+        """, (f"-{max_age} seconds",)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_probe(self, sha256: str) -> Optional[dict]:
+        """Cached ffprobe metadata for a file with this content hash."""
+        conn = self._get_conn()
+        row = conn.execute(
+            "SELECT probe FROM probe_cache WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_probe(self, sha256: str, probe: dict):
+        conn = self._get_conn()
+        conn.execute("""
+            INSERT OR REPLACE INTO probe_cache (sha256, probe) VALUES (?, ?)
+        """, (sha256, json.dumps(probe)))
+        conn.commit()
+
+    def match_cached_transcript(self, fingerprint: str, profile: str, duration: float,
+                                tolerance: float, distance, max_distance: float) -> Optional[dict]:
+        """
+        Transcript of the closest cached audio for this decoding profile, or None.
+
+        Only entries within `tolerance` seconds of `duration` that share a
+        fingerprint band are compared. distance(a, b) scores two
+        fingerprints; the best entry must score at most max_distance, and is
+        marked as recently used.
+        """
+        bands = fingerprint_bands(fingerprint)
+        if not bands:
+            return None
+        conn = self._get_conn()
+        rows = conn.execute(f"""
+            WITH query(band, bits) AS (VALUES {", ".join(["(?, ?)"] * len(bands))})
+            SELECT DISTINCT c.id, c.fingerprint FROM query q
+            JOIN transcript_cache_bands fb ON fb.band = q.band AND fb.bits = q.bits
+            JOIN transcript_cache c ON c.id = fb.entry_id
+            WHERE c.profile = ? AND c.duration BETWEEN ? AND ?
+        """, [v for band in bands for v in band]
+             + [profile, duration - tolerance, duration + tolerance]).fetchall()
+        scored = [(distance(fingerprint, row["fingerprint"]), row["id"]) for row in rows]
+        best = min(scored, default=None)
+        if best is None or best[0] > max_distance:
+            return None
+        row = conn.execute("""
+            UPDATE transcript_cache SET last_used = ? WHERE id = ? RETURNING transcript
+        """, (datetime.now(), best[1])).fetchone()
+        conn.commit()
+        return json.loads(row[0]) if row else None
+
+    def _index_fingerprint(self, conn, entry_id: int, fingerprint: str):
+        conn.executemany("""
+            INSERT OR IGNORE INTO transcript_cache_bands (band, bits, entry_id) VALUES (?, ?, ?)
+        """, [(band, bits, entry_id) for band, bits in fingerprint_bands(fingerprint)])
+
+    def save_cached_transcript(self, fingerprint: str, duration: float, profile: str,
+                               transcript: dict, max_entries: int):
+        """Cache a chunk transcript, evicting the least recently used beyond max_entries."""
+        conn = self._get_conn()
+        entry_id = conn.execute("""
+            INSERT INTO transcript_cache (fingerprint, duration, profile, transcript, last_used)
+            VALUES (?, ?, ?, ?, ?)
+        """, (fingerprint, duration, profile, json.dumps(transcript), datetime.now())).lastrowid
+        self._index_fingerprint(conn, entry_id, fingerprint)
+        evicted = conn.execute("""
+            DELETE FROM transcript_cache WHERE id NOT IN (
+                SELECT id FROM transcript_cache ORDER BY last_used DESC LIMIT ?
+            )
+            RETURNING id
+        """, (max_entries,)).fetchall()
+        conn.executemany("DELETE FROM transcript_cache_bands WHERE entry_id = ?",
+                         [(row[0],) for row in evicted])
+        conn.commit()
+
+    def count_cached_transcripts(self) -> int:
+        conn = self._get_conn()
+        return conn.execute("SELECT COUNT(*) FROM transcript_cache").fetchone()[0]
+
+    def register_worker(self, worker_id: str, hostname: str, hardware: dict = None,
+                        model: str = None, rtf: float = None):
+        """
+        Args:
+            hardware: What the worker runs on (device, GPU, CPU count, ...)
+            model: Whisper model size the worker loaded
+            rtf: Real-time factor the worker measured on earlier chunks
+        """
         conn = self._get_conn()
         conn.execute("""
-            INSERT OR REPLACE INTO workers (worker_id, hostname, last_heartbeat)
-            VALUES (?, ?, ?)
-        """, (worker_id, hostname, datetime.now()))
+            INSERT OR REPLACE INTO workers (worker_id, hostname, last_heartbeat, hardware, model, rtf)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (worker_id, hostname, datetime.now(),
+              json.dumps(hardware) if hardware else None, model, rtf))
         conn.commit()
-        conn.close()
 
     def worker_heartbeat(self, worker_id: str):
         conn = self._get_conn()
@@ -293,7 +907,6 @@ class Database:
             UPDATE workers SET last_heartbeat = ? WHERE worker_id = ?
         """, (datetime.now(), worker_id))
         conn.commit()
-        conn.close()
 
     def get_active_workers(self) -> list[dict]:
         conn = self._get_conn()
@@ -302,18 +915,17 @@ class Database:
         rows = conn.execute("""
             SELECT * FROM workers WHERE last_heartbeat > ?
         """, (threshold,)).fetchall()
-        conn.close()
         return [dict(row) for row in rows]
 
     def reset_in_progress_tasks(self):
         """Reset all in-progress tasks back to pending status."""
         conn = self._get_conn()
+        conn.execute("DELETE FROM task_leases")
         conn.execute("""
             UPDATE tasks SET status = 'pending', worker_id = NULL, started_at = NULL
             WHERE status = 'in_progress'
         """)
         conn.commit()
-        conn.close()
 
     def add_log(self, log_type: str, message: str):
         """Add an activity log entry."""
@@ -330,7 +942,6 @@ class Database:
             )
         """)
         conn.commit()
-        conn.close()
 
     def get_recent_logs(self, limit: int = 100) -> list[dict]:
         """Get recent activity logs."""
@@ -339,5 +950,4 @@ class Database:
             SELECT log_type, message, created_at FROM activity_logs
             ORDER BY created_at DESC LIMIT ?
         """, (limit,)).fetchall()
-        conn.close()
         return [dict(row) for row in rows]
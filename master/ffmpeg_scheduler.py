@@ -0,0 +1,109 @@
+"""
+Global scheduler for ffmpeg jobs on the master.
+
+Splitting, silence detection, chunk fingerprinting and archival compression
+all share one pool of job slots sized from the CPU count and current load
+average, leaving a core for the web server. Waiting jobs are started in priority order (splitting
+before archival compression, since chunks gate the workers) and every job's
+ffmpeg runs under `nice`, so request handling keeps precedence over encoding.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import shutil
+from contextlib import asynccontextmanager
+
+# Job priorities (lower runs first) and the niceness their processes run at
+PRIORITY_SPLIT = 0
+PRIORITY_FINGERPRINT = 5
+PRIORITY_ARCHIVE = 10
+NICENESS = {PRIORITY_SPLIT: 5, PRIORITY_FINGERPRINT: 10, PRIORITY_ARCHIVE: 10}
+PRIORITY_NAMES = {PRIORITY_SPLIT: "split", PRIORITY_FINGERPRINT: "fingerprint",
+                  PRIORITY_ARCHIVE: "archive"}
+
+
+class FFmpegScheduler:
+    def __init__(self, max_jobs: int = None, reserve_cores: int = 1):
+        """
+        Args:
+            max_jobs: Fixed number of concurrent ffmpeg jobs (default: sized from
+                CPU count and load average)
+            reserve_cores: Cores left free for the web server
+        """
+        self.cpu_count = os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.reserve_cores = reserve_cores
+        self.running = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._nice = shutil.which("nice") if os.name == "posix" else None
+
+    def capacity(self) -> int:
+        """How many ffmpeg jobs may run right now."""
+        if self.max_jobs:
+            return self.max_jobs
+        available = max(1, self.cpu_count - self.reserve_cores)
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            return available  # Windows: no load average
+        # Load not caused by our own jobs (other processes, the web server)
+        external = max(0.0, load - self.running)
+        return max(1, min(available, round(self.cpu_count - self.reserve_cores - external)))
+
+    def command(self, cmd: list[str], priority: int) -> list[str]:
+        """Wrap an ffmpeg command so it runs at the niceness of its priority."""
+        if self._nice:
+            return [self._nice, "-n", str(NICENESS.get(priority, 10)), *cmd]
+        return cmd
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_ARCHIVE):
+        """Hold one job slot for the duration of the block."""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int):
+        if not self._waiters and self.running < self.capacity():
+            self.running += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed over just as we were cancelled
+                self._release()
+            raise
+
+    def _release(self):
+        self.running -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.running < self.capacity():
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue  # Waiter was cancelled
+            self.running += 1
+            fut.set_result(None)
+
+    def stats(self) -> dict:
+        """Slot usage and queue depth per priority."""
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, fut in self._waiters:
+            if not fut.done():
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                queued[name] = queued.get(name, 0) + 1
+        return {
+            "capacity": self.capacity(),
+            "running": self.running,
+            "queued": queued,
+            "queue_depth": sum(queued.values()),
+        }
@@ -0,0 +1,81 @@
+"""
+File responses with byte-range support.
+
+Starlette's FileResponse always sends the whole file. Workers resume
+interrupted chunk downloads with `Range: bytes=N-`, so chunks are served
+with Accept-Ranges, a caller-supplied ETag (checked against If-Range and
+If-None-Match) and 206/416 responses for single byte ranges.
+"""
+
+import asyncio
+import mimetypes
+import re
+from pathlib import Path
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+BLOCK_SIZE = 1024 * 1024  # Bytes read per block of a partial response
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int):
+    """
+    Resolve a single-range Range header against a file of `size` bytes.
+
+    Returns (start, end) inclusive, None if the header is absent or not a
+    single byte range (the whole file is sent), or raises ValueError if the
+    range cannot be satisfied.
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(match.group(2)))
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header!r} not satisfiable for {size} bytes")
+    return start, end
+
+
+async def _read_range(path: Path, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = await asyncio.to_thread(f.read, min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def file_response(request: Request, path: Path, etag: str) -> Response:
+    """Serve path whole or by byte range, tagged with a strong ETag."""
+    size = path.stat().st_size
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{etag}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == headers["ETag"]:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            return StreamingResponse(
+                _read_range(path, start, end),
+                status_code=206,
+                media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}",
+                         "Content-Length": str(end - start + 1)},
+            )
+    # No range, or If-Range names an older version of the file: send it whole
+    return FileResponse(path, headers=headers)
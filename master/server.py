@@ -4,28 +4,36 @@ Handles task distribution, progress tracking, and result aggregation.
 """
 
 import asyncio
+import hashlib
 import json
 import os
 import secrets
 import shutil
 import uuid
 import subprocess
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 
 import httpx
 from dotenv import load_dotenv
-from fastapi import Cookie, FastAPI, File, Form, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi import Cookie, FastAPI, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 
-from database import Database
-from audio_splitter import AudioSplitter
+from async_database import AsyncDatabase
+from database import SCHEDULING_POLICIES, Database
+from audio_splitter import ARCHIVE_ENCODE_ARGS, AudioSplitter, StreamSplitJob
+from ffmpeg_scheduler import PRIORITY_ARCHIVE, FFmpegScheduler
+from transcript_cache import TranscriptCache, fingerprint_audio, profile_key
+from transcript_merge import merge_chunk_segments
+from range_response import file_response
+from upload_stream import receive_file
 
 # Load environment variables from .env file
 load_dotenv()
@@ -75,6 +83,13 @@ def get_current_user(session_token: Optional[str] = Cookie(None)) -> Optional[st
 UPLOAD_DIR = Path(__file__).parent.parent / "uploads"
 CHUNKS_DIR = Path(__file__).parent.parent / "chunks"
 RESULTS_DIR = Path(__file__).parent.parent / "results"
+MAX_LEASE_BATCH = 16  # Most tasks one /tasks/lease call hands out
+DISPATCH_ACK_TIMEOUT = float(os.environ.get("DISPATCH_ACK_TIMEOUT", 30))
+DISPATCH_INTERVAL = 10  # Seconds between dispatch passes when nothing wakes the dispatcher
+# Resumable upload sessions older than this are deleted with their partial file
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24)) * 3600
+UPLOAD_SWEEP_INTERVAL = 300  # Seconds between checks for expired and idle upload sessions
+UPLOAD_IDLE_SECONDS = 600  # A resumable upload's split job stops after this long without data
 
 # Ensure directories exist
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -86,9 +101,18 @@ app = FastAPI(title="Distributed STT Master")
 
 @app.on_event("startup")
 async def startup_event():
-    """Log storage paths on startup."""
+    """Log storage paths on startup and start the background sweepers and task dispatcher."""
     print(f"[SERVER] Results (merged MP3 + JSON): {RESULTS_DIR.absolute()}")
     print(f"[SERVER] Chunks: {CHUNKS_DIR.absolute()}")
+    asyncio.create_task(sweep_expired_leases())
+    asyncio.create_task(dispatch_loop())
+    asyncio.create_task(sweep_upload_sessions())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled database connections."""
+    db.close()
 
 
 app.add_middleware(
@@ -99,14 +123,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database and splitter
-db = Database()
-splitter = AudioSplitter(CHUNKS_DIR)
+# Database, ffmpeg job scheduler and splitter
+db = AsyncDatabase(Database(
+    policy=os.environ.get("SCHEDULER_POLICY", "fair"),
+    speculate_last_n=int(os.environ.get("SPECULATE_LAST_N", 2)),
+    lease_ttl=float(os.environ.get("LEASE_TTL_SECONDS", 90)),
+))
+ffmpeg_scheduler = FFmpegScheduler(max_jobs=int(os.environ.get("FFMPEG_MAX_JOBS", 0)) or None)
+splitter = AudioSplitter(
+    CHUNKS_DIR,
+    scheduler=ffmpeg_scheduler,
+    engine=os.environ.get("SPLIT_ENGINE", "segment"),
+    boundary_window=float(os.environ.get("SPLIT_BOUNDARY_WINDOW", 10)),
+    overlap=float(os.environ.get("SPLIT_OVERLAP", 0)),
+    probe_store=db,
+)
+transcript_cache = TranscriptCache(
+    db, max_entries=int(os.environ.get("TRANSCRIPT_CACHE_MAX_ENTRIES", 5000)))
 
 # WebSocket connections for progress updates
 connected_clients: dict[str, WebSocket] = {}
 dashboard_clients: list[WebSocket] = []
 
+# Push dispatch: WebSocket workers say how many more tasks they want ("ready")
+# and the dispatcher pushes assignments as soon as chunks are available
+worker_slots: dict[str, dict] = {}  # worker_id -> {"slots", "idle", "profile": (model, language, params)}
+unacked_tasks: dict[str, tuple] = {}  # task_id -> (worker_id, ack deadline)
+dispatch_wakeup = asyncio.Event()
+dispatch_metrics = {"pushed": 0, "acked": 0, "revoked": 0}
+
 # In-progress upload control (upload_id -> cancel or create-as-paused)
 current_upload_id: Optional[str] = None
 current_upload_info: Optional[dict] = None  # { upload_id, filename, phase, current, total, size_mb, chunking_paused }
@@ -115,6 +160,12 @@ upload_create_paused: set = set()
 upload_chunking_paused: set = set()
 upload_resume_events: dict = {}  # upload_id -> asyncio.Event
 
+# Pipelined ingest: streamable uploads are split while their bytes arrive
+upload_split_jobs: dict[str, StreamSplitJob] = {}  # upload_id -> running split
+upload_started_at: dict[str, float] = {}  # upload_id -> time.monotonic()
+ingesting_books: set = set()  # book_ids still receiving chunks (no merge yet)
+ingest_metrics = {"books": 0, "last_time_to_first_task": None, "total_time_to_first_task": 0.0}
+
 
 class UploadCancelled(Exception):
     """Raised when the user cancels an in-progress upload."""
@@ -126,16 +177,29 @@ class TaskComplete(BaseModel):
     worker_id: str
     transcript: dict
     processing_time: float
+    lease_token: int  # From the task's claim; a stale token is refused
+    # Decoding profile, so the transcript can be reused for matching audio
+    model: Optional[str] = None
+    language: Optional[str] = None
+    params: Optional[str] = None
+
+
+class TaskRelease(BaseModel):
+    worker_id: str
+    task_ids: list[str]
 
 
 class WorkerRegister(BaseModel):
     worker_id: str
     hostname: str
+    hardware: Optional[dict] = None  # e.g. {"device": "cuda", "gpu": "RTX 3080", "cpu_count": 16}
+    model: Optional[str] = None
+    rtf: Optional[float] = None  # Processing seconds per audio second measured by the worker
 
 
 # ----- WebSocket Management -----
 
-def save_activity_log(data: dict):
+async def save_activity_log(data: dict):
     """Save activity log to database based on event type."""
     event_type = data.get("type")
     log_type = None
@@ -157,6 +221,9 @@ def save_activity_log(data: dict):
     elif event_type == "splitting_complete":
         log_type = "upload"
         message = f"Split complete: {data.get('filename')} ({data.get('total_chunks')} chunks)"
+    elif event_type == "first_task_ready":
+        log_type = "upload"
+        message = f"First chunk of {data.get('filename')} ready after {data.get('seconds')}s"
     elif event_type == "book_added":
         log_type = "book"
         message = f"New book: {data.get('filename')} ({data.get('total_chunks')} chunks)"
@@ -181,13 +248,13 @@ def save_activity_log(data: dict):
         message = f"Worker {data.get('worker_id')} disconnected"
 
     if log_type and message:
-        db.add_log(log_type, message)
+        await db.add_log(log_type, message)
 
 
 async def broadcast_progress(data: dict):
     """Send progress update to all dashboard clients."""
     # Save to database
-    save_activity_log(data)
+    await save_activity_log(data)
     
     message = json.dumps(data)
     disconnected = []
@@ -257,18 +324,14 @@ async def auth_status(session_token: Optional[str] = Cookie(None)):
 async def compress_audio_background(input_path: Path, output_path: Path):
     """Compress audio to a low-bitrate MP3 in the background."""
     try:
-        # Compress to 32kbps mono MP3 (excellent voice quality, tiny file size)
-        cmd = [
-            "ffmpeg", "-y", "-i", str(input_path),
-            "-vn", "-ar", "22050", "-ac", "1", "-b:a", "32k",
-            str(output_path)
-        ]
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
+        cmd = ["ffmpeg", "-y", "-i", str(input_path), "-vn", *ARCHIVE_ENCODE_ARGS, str(output_path)]
+        async with ffmpeg_scheduler.slot(PRIORITY_ARCHIVE):
+            process = await asyncio.create_subprocess_exec(
+                *ffmpeg_scheduler.command(cmd, PRIORITY_ARCHIVE),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
         
         if process.returncode == 0:
             print(f"[COMPRESS] Successfully compressed audio to {output_path.name}")
@@ -278,47 +341,41 @@ async def compress_audio_background(input_path: Path, output_path: Path):
         print(f"[COMPRESS] Exception during compression: {e}")
 
 
-@app.post("/upload")
-async def upload_audiobook(
-    file: UploadFile = File(...),
-    session_token: Optional[str] = Cookie(None)
-):
-    """Upload an audiobook and split it into chunks. Requires admin auth."""
+def _cleanup_upload(upload_id: str, filename: Optional[str]):
+    """Remove upload file(s) and any chunks for this upload's book_id."""
     global current_upload_id, current_upload_info
-
-    user = get_current_user(session_token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Authentication required")
-
-    upload_id = str(uuid.uuid4())[:8]
     book_id = upload_id
-    current_upload_id = upload_id
-
-    def _cleanup_cancelled():
-        """Remove upload file and any chunks for this book_id."""
-        global current_upload_id, current_upload_info
+    paths = [UPLOAD_DIR / f"{book_id}.part"]
+    if filename:
+        paths.append(UPLOAD_DIR / f"{book_id}_{filename}")
+    for p in paths:
         try:
-            file_path = UPLOAD_DIR / f"{book_id}_{file.filename}"
-            if file_path.exists():
-                file_path.unlink()
+            p.unlink(missing_ok=True)
         except Exception as e:
             print(f"[UPLOAD] Cleanup file error: {e}")
-        for p in CHUNKS_DIR.glob(f"{book_id}_*"):
-            try:
-                p.unlink()
-            except Exception:
-                pass
-        upload_cancel_requested.discard(upload_id)
-        upload_create_paused.discard(upload_id)
-        upload_chunking_paused.discard(upload_id)
-        upload_resume_events.pop(upload_id, None)
+    for p in CHUNKS_DIR.glob(f"{book_id}_*"):
+        try:
+            p.unlink()
+        except Exception:
+            pass
+    upload_cancel_requested.discard(upload_id)
+    upload_create_paused.discard(upload_id)
+    upload_chunking_paused.discard(upload_id)
+    upload_resume_events.pop(upload_id, None)
+    if current_upload_id in (None, upload_id):
         current_upload_id = None
         current_upload_info = None
 
-    # Broadcast: upload started (include upload_id for dashboard cancel/pause)
+
+async def _upload_started(upload_id: str, filename: str):
+    """Record and broadcast the start of an upload (include upload_id for dashboard cancel/pause)."""
+    global current_upload_id, current_upload_info
+    current_upload_id = upload_id
+    upload_started_at.setdefault(upload_id, time.monotonic())
+    ingesting_books.add(upload_id)
     current_upload_info = {
         "upload_id": upload_id,
-        "filename": file.filename,
+        "filename": filename,
         "phase": "receiving",
         "current": 0,
         "total": 0,
@@ -328,42 +385,222 @@ async def upload_audiobook(
     await broadcast_progress({
         "type": "upload_started",
         "upload_id": upload_id,
-        "filename": file.filename,
+        "filename": filename,
     })
 
+
+_last_receiving_broadcast: dict[str, float] = {}  # upload_id -> loop time
+
+
+async def _upload_receiving(upload_id: str, filename: str, received: int, total: int):
+    """Broadcast byte-level receive progress, at most twice a second per upload."""
+    if upload_id in upload_cancel_requested:
+        raise UploadCancelled()
+    now = asyncio.get_running_loop().time()
+    if now - _last_receiving_broadcast.get(upload_id, 0.0) < 0.5 and received < total:
+        return
+    _last_receiving_broadcast[upload_id] = now
+    if current_upload_info and current_upload_info.get("upload_id") == upload_id:
+        current_upload_info["current"] = received
+        current_upload_info["total"] = total
+        current_upload_info["size_mb"] = round(received / (1024 * 1024), 2)
+    await broadcast_progress({
+        "type": "upload_receiving",
+        "upload_id": upload_id,
+        "filename": filename,
+        "received_bytes": received,
+        "total_bytes": total,
+    })
+
+
+async def _fingerprint_chunk(chunk_path: Path) -> Optional[str]:
+    """Fingerprint a chunk's audio for the transcript cache; None if it cannot be decoded."""
     try:
-        # Save uploaded file
-        file_path = UPLOAD_DIR / f"{book_id}_{file.filename}"
-        content = await file.read()
-        file_path.write_bytes(content)
+        return await fingerprint_audio(chunk_path, ffmpeg_scheduler)
+    except (RuntimeError, OSError) as e:
+        print(f"[CACHE] Could not fingerprint {chunk_path.name}: {e}")
+        return None
+
+
+async def _create_chunk_task(upload_id: str, filename: str, chunk: dict):
+    """Create the task for one chunk and record time-to-first-task for the book."""
+    book_id = upload_id
+    if upload_id in upload_create_paused:
+        await db.pause_book(book_id)
+    # Published with the task so workers can verify their download
+    chunk_sha256 = await asyncio.to_thread(_sha256_file, Path(chunk["path"]))
+    # Computed before the task exists, so the first claim can already use the cache
+    fingerprint = None
+    if transcript_cache.enabled:
+        fingerprint = await _fingerprint_chunk(Path(chunk["path"]))
+    await db.create_task(
+        book_id=book_id,
+        chunk_id=chunk["chunk_id"],
+        chunk_path=chunk["path"],
+        start_time=chunk["start"],
+        end_time=chunk["end"],
+        original_filename=filename,
+        chunk_sha256=chunk_sha256,
+        chunk_size=Path(chunk["path"]).stat().st_size,
+        fingerprint=fingerprint
+    )
+    dispatch_wakeup.set()
+
+    started = upload_started_at.pop(upload_id, None)
+    if started is not None:
+        elapsed = time.monotonic() - started
+        ingest_metrics["books"] += 1
+        ingest_metrics["last_time_to_first_task"] = round(elapsed, 2)
+        ingest_metrics["total_time_to_first_task"] += elapsed
+        await broadcast_progress({
+            "type": "first_task_ready",
+            "upload_id": upload_id,
+            "filename": filename,
+            "seconds": round(elapsed, 2),
+        })
+
+
+def _archive_path(filename: str) -> Path:
+    """Where the compressed copy of an uploaded book is kept."""
+    return RESULTS_DIR / f"{Path(Path(filename).name.strip()).stem}.mp3"
+
+
+async def _start_split_job(upload_id: str, filename: str) -> Optional[StreamSplitJob]:
+    """Begin splitting a streamable upload as it arrives; None if not possible."""
+    if not splitter.is_streamable(filename):
+        return None
+
+    async def on_chunk(chunk: dict):
+        await _create_chunk_task(upload_id, filename, chunk)
 
+    try:
+        job = await splitter.start_stream_split(upload_id, on_chunk,
+                                                archive_path=_archive_path(filename))
+    except OSError as e:
+        print(f"[UPLOAD] Pipelined split unavailable: {e}")
+        return None
+    upload_split_jobs[upload_id] = job
+    return job
+
+
+async def _discard_split_job(upload_id: str):
+    """Stop a pipelined split and drop the tasks and chunks it already produced."""
+    job = upload_split_jobs.pop(upload_id, None)
+    if job is not None:
+        await job.abort()
+    for chunk_path in await db.delete_book(upload_id):
+        Path(chunk_path).unlink(missing_ok=True)
+
+
+def _duplicate_status(book: Optional[dict]) -> Optional[str]:
+    """"completed" or "in_progress" for a book sharing an upload's audio; None if unusable."""
+    if book is None:
+        return None
+    if book["total_chunks"] and book["completed_chunks"] == book["total_chunks"]:
+        return "completed"
+    if book["total_chunks"] or book["book_id"] in ingesting_books:
+        return "in_progress"
+    return None  # Left behind by an ingest that failed before creating any task
+
+
+async def _claim_book(book_id: str, filename: str, sha256: str) -> Optional[dict]:
+    """Register this upload's content hash; return the live book that already has it."""
+    while True:
+        existing = await db.claim_book_hash(book_id, filename, sha256)
+        if existing is None or _duplicate_status(existing):
+            return existing
+        await db.delete_book(existing["book_id"])
+
+
+def _duplicate_response(filename: str, book: dict) -> dict:
+    status = _duplicate_status(book)
+    response = {
+        "book_id": book["book_id"],
+        "filename": filename,
+        "duplicate_of": book["book_id"],
+        "status": status,
+        "chunks_created": 0,
+    }
+    if status == "completed":
+        response["result_url"] = f"/results/{book['book_id']}"
+    return response
+
+
+async def _attach_duplicate(upload_id: str, filename: str, file_path: Path,
+                            book: dict, split_job: Optional[StreamSplitJob]) -> dict:
+    """Drop an upload whose audio is already a book and point the caller at that book."""
+    if split_job is not None:
+        # Let the archive encode complete rather than leave a truncated file
+        try:
+            await split_job.finish()
+        except RuntimeError:
+            pass
+    for chunk_path in await db.delete_book(upload_id):
+        Path(chunk_path).unlink(missing_ok=True)
+    if _archive_path(filename) != _archive_path(book["original_filename"] or ""):
+        _archive_path(filename).unlink(missing_ok=True)
+    file_path.unlink(missing_ok=True)
+
+    response = _duplicate_response(filename, book)
+    await db.add_log("book", f"Upload {filename} is a duplicate of book {book['book_id']} "
+                             f"({response['status']})")
+    await broadcast_progress({"type": "upload_duplicate", "upload_id": upload_id, **response})
+    return response
+
+
+async def ingest_upload(upload_id: str, filename: str, file_path: Path,
+                        size: int, sha256: str) -> dict:
+    """Split a fully received upload into chunk tasks. Shared by /upload and /uploads."""
+    global current_upload_id, current_upload_info
+    book_id = upload_id
+    _last_receiving_broadcast.pop(upload_id, None)
+    split_job = upload_split_jobs.pop(upload_id, None)
+
+    try:
         if upload_id in upload_cancel_requested:
-            _cleanup_cancelled()
-            await broadcast_progress({"type": "upload_cancelled", "upload_id": upload_id, "filename": file.filename})
-            return {"cancelled": True, "upload_id": upload_id}
+            raise UploadCancelled()
 
         # Broadcast: upload saved
-        size_mb = len(content) / (1024 * 1024)
+        size_mb = size / (1024 * 1024)
         if current_upload_info:
             current_upload_info["phase"] = "splitting"
             current_upload_info["size_mb"] = round(size_mb, 2)
+            current_upload_info["current"] = 0
+            current_upload_info["total"] = 0
         await broadcast_progress({
             "type": "upload_saved",
             "upload_id": upload_id,
-            "filename": file.filename,
+            "filename": filename,
             "size_mb": round(size_mb, 2),
+            "sha256": sha256,
         })
 
-        safe_original_name = Path(file.filename).name.strip()
-        final_audio_path = RESULTS_DIR / f"{Path(safe_original_name).stem}.mp3"
-        asyncio.create_task(compress_audio_background(file_path, final_audio_path))
+        # Same audio under another name: reuse that book instead of transcribing again
+        existing = await _claim_book(book_id, filename, sha256)
+        if existing is not None:
+            job, split_job = split_job, None
+            return await _attach_duplicate(upload_id, filename, file_path, existing, job)
 
-        duration = await splitter.get_audio_duration(file_path)
+        final_audio_path = _archive_path(filename)
+        if split_job is not None:
+            # Chunks were cut (and tasks created) and the archive encoded while
+            # the upload arrived
+            try:
+                chunks = await split_job.finish()
+            except RuntimeError as e:
+                print(f"[UPLOAD] {e}; splitting the saved file instead")
+                upload_split_jobs[upload_id] = split_job
+                split_job = None
+                await _discard_split_job(upload_id)
+            else:
+                return await _finish_ingest(upload_id, filename, chunks)
+
+        duration = await splitter.get_audio_duration(file_path, sha256)
         num_chunks = int(duration // splitter.chunk_duration) + 1
         await broadcast_progress({
             "type": "splitting_started",
             "upload_id": upload_id,
-            "filename": file.filename,
+            "filename": filename,
             "total_chunks": num_chunks,
         })
         if current_upload_info:
@@ -378,7 +615,7 @@ async def upload_audiobook(
             await broadcast_progress({
                 "type": "splitting_progress",
                 "upload_id": upload_id,
-                "filename": file.filename,
+                "filename": filename,
                 "current": current,
                 "total": total,
             })
@@ -391,7 +628,7 @@ async def upload_audiobook(
                     await broadcast_progress({
                         "type": "splitting_paused",
                         "upload_id": upload_id,
-                        "filename": file.filename,
+                        "filename": filename,
                         "current": current,
                         "total": total,
                     })
@@ -402,65 +639,387 @@ async def upload_audiobook(
                     await broadcast_progress({
                         "type": "splitting_resumed",
                         "upload_id": upload_id,
-                        "filename": file.filename,
+                        "filename": filename,
                         "current": current,
                         "total": total,
                     })
 
-        chunks = await splitter.split_audio(file_path, book_id, progress_callback=splitting_progress)
+        if splitter.fuses_archive():
+            # Archive is encoded from the same decode as the chunks
+            chunks = await splitter.split_audio(file_path, book_id,
+                                                progress_callback=splitting_progress,
+                                                archive_path=final_audio_path,
+                                                sha256=sha256)
+        else:
+            asyncio.create_task(compress_audio_background(file_path, final_audio_path))
+            chunks = await splitter.split_audio(file_path, book_id,
+                                                progress_callback=splitting_progress,
+                                                sha256=sha256)
 
         if upload_id in upload_cancel_requested:
-            _cleanup_cancelled()
-            await broadcast_progress({"type": "upload_cancelled", "upload_id": upload_id, "filename": file.filename})
-            return {"cancelled": True, "upload_id": upload_id}
-
-        await broadcast_progress({
-            "type": "splitting_complete",
-            "upload_id": upload_id,
-            "filename": file.filename,
-            "total_chunks": len(chunks),
-        })
+            raise UploadCancelled()
 
         for chunk in chunks:
-            db.create_task(
-                book_id=book_id,
-                chunk_id=chunk["chunk_id"],
-                chunk_path=chunk["path"],
-                start_time=chunk["start"],
-                end_time=chunk["end"],
-                original_filename=file.filename
-            )
+            await _create_chunk_task(upload_id, filename, chunk)
 
-        if upload_id in upload_create_paused:
-            db.pause_book(book_id)
-            upload_create_paused.discard(upload_id)
+        return await _finish_ingest(upload_id, filename, chunks)
 
-        upload_cancel_requested.discard(upload_id)
-        upload_resume_events.pop(upload_id, None)
+    except UploadCancelled:
+        if split_job is not None:
+            upload_split_jobs[upload_id] = split_job
+        await _discard_split_job(upload_id)
+        _cleanup_upload(upload_id, filename)
+        await broadcast_progress({"type": "upload_cancelled", "upload_id": upload_id, "filename": filename})
+        return {"cancelled": True, "upload_id": upload_id}
+    finally:
+        ingesting_books.discard(book_id)
+        upload_started_at.pop(upload_id, None)
         current_upload_id = None
+        current_upload_info = None
 
-        await broadcast_progress({
-            "type": "book_added",
-            "book_id": book_id,
-            "filename": file.filename,
-            "total_chunks": len(chunks)
-        })
 
-        current_upload_info = None
+async def _finish_ingest(upload_id: str, filename: str, chunks: list[dict]) -> dict:
+    """Announce a fully split upload; tasks for every chunk already exist."""
+    global current_upload_id, current_upload_info
+    book_id = upload_id
+
+    await broadcast_progress({
+        "type": "splitting_complete",
+        "upload_id": upload_id,
+        "filename": filename,
+        "total_chunks": len(chunks),
+    })
+
+    if upload_id in upload_create_paused:
+        await db.pause_book(book_id)
+        upload_create_paused.discard(upload_id)
+
+    upload_cancel_requested.discard(upload_id)
+    upload_resume_events.pop(upload_id, None)
+    ingesting_books.discard(book_id)
+    current_upload_id = None
 
-        return {
-            "book_id": book_id,
-            "filename": file.filename,
-            "chunks_created": len(chunks)
-        }
+    await broadcast_progress({
+        "type": "book_added",
+        "book_id": book_id,
+        "filename": filename,
+        "total_chunks": len(chunks)
+    })
+
+    current_upload_info = None
+
+    # With pipelined ingest, workers may have finished every chunk already
+    book_status = await db.get_book_status(book_id)
+    if book_status["total"] and book_status["completed"] == book_status["total"]:
+        await merge_book_results(book_id)
+
+    return {
+        "book_id": book_id,
+        "filename": filename,
+        "chunks_created": len(chunks)
+    }
 
+
+@app.post("/upload")
+async def upload_audiobook(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """Upload an audiobook and split it into chunks. Requires admin auth.
+
+    The multipart body is streamed straight to disk (see upload_stream), so
+    the file is never held in memory.
+    """
+    user = get_current_user(session_token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    upload_id = str(uuid.uuid4())[:8]
+    partial_path = UPLOAD_DIR / f"{upload_id}.part"
+    filename = None
+    split_job = None
+
+    async def receiving_started(name: str):
+        nonlocal filename, split_job
+        filename = name
+        await _upload_started(upload_id, filename)
+        split_job = await _start_split_job(upload_id, filename)
+
+    async def receiving_progress(received: int, total: int):
+        await _upload_receiving(upload_id, filename, received, total)
+
+    async def receiving_block(block: bytes):
+        if split_job is not None:
+            await split_job.feed(block)
+
+    try:
+        # Stream uploaded file to disk (and into the splitter, if streamable)
+        received = await receive_file(request, partial_path,
+                                      on_started=receiving_started,
+                                      on_progress=receiving_progress,
+                                      on_block=receiving_block)
     except UploadCancelled:
-        _cleanup_cancelled()
-        await broadcast_progress({"type": "upload_cancelled", "upload_id": upload_id, "filename": file.filename})
+        await _discard_split_job(upload_id)
+        ingesting_books.discard(upload_id)
+        upload_started_at.pop(upload_id, None)
+        _cleanup_upload(upload_id, filename)
+        await broadcast_progress({"type": "upload_cancelled", "upload_id": upload_id, "filename": filename})
         return {"cancelled": True, "upload_id": upload_id}
-    finally:
+    except Exception:
+        # Includes the client disconnecting mid-upload
+        await _discard_split_job(upload_id)
+        ingesting_books.discard(upload_id)
+        upload_started_at.pop(upload_id, None)
+        _cleanup_upload(upload_id, filename)
+        raise
+
+    file_path = UPLOAD_DIR / f"{upload_id}_{filename}"
+    partial_path.replace(file_path)
+    return await ingest_upload(upload_id, filename, file_path,
+                               received["size"], received["sha256"])
+
+
+# ----- Resumable Uploads -----
+# tus-style protocol used by the watcher: create a session, PUT byte ranges
+# at the committed offset, query the offset after an interruption, finalize.
+# The committed offset is the size of the partial file on disk.
+
+RESUMABLE_BLOCK_SIZE = 1024 * 1024
+upload_session_locks: dict[str, asyncio.Lock] = {}
+upload_session_activity: dict[str, float] = {}  # upload_id -> time.monotonic() of last data
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None  # Lets the master skip audio it already has
+
+
+def _upload_session_state(session: dict) -> dict:
+    partial_path = UPLOAD_DIR / f"{session['upload_id']}.part"
+    offset = partial_path.stat().st_size if partial_path.exists() else 0
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": offset,
+    }
+
+
+async def _get_upload_session(upload_id: str, session_token: Optional[str]) -> dict:
+    if not get_current_user(session_token):
+        raise HTTPException(status_code=401, detail="Authentication required")
+    session = await db.get_upload_session(upload_id)
+    if not session:
+        raise HTTPException(404, "Upload session not found")
+    return session
+
+
+def _sha256_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(RESUMABLE_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+@app.post("/uploads", status_code=201)
+async def create_upload_session(data: UploadSessionCreate, session_token: Optional[str] = Cookie(None)):
+    """Start a resumable upload. Requires admin auth."""
+    if not get_current_user(session_token):
+        raise HTTPException(status_code=401, detail="Authentication required")
+    filename = Path(data.filename).name.strip()
+    if not filename or data.size <= 0:
+        raise HTTPException(400, "filename and a positive size are required")
+
+    if data.sha256:
+        existing = await db.find_book_by_hash(data.sha256.lower())
+        if _duplicate_status(existing):
+            response = _duplicate_response(filename, existing)
+            await db.add_log("book", f"Upload {filename} skipped: duplicate of book "
+                                     f"{existing['book_id']} ({response['status']})")
+            return JSONResponse(response, status_code=200)
+
+    upload_id = str(uuid.uuid4())[:8]
+    await db.create_upload_session(upload_id, filename, data.size)
+    (UPLOAD_DIR / f"{upload_id}.part").touch()
+    return {"upload_id": upload_id, "offset": 0, "size": data.size}
+
+
+async def _activate_upload_session(upload_id: str, filename: str, partial_path: Path):
+    """
+    Show a resumable upload as receiving and start its pipelined split.
+
+    Runs on the first PUT, and again on the first PUT after the session went
+    idle or the master restarted; bytes already stored are replayed into the
+    new split job, which recreates the chunks the previous one had cut.
+    """
+    upload_session_activity[upload_id] = time.monotonic()
+    if current_upload_id != upload_id:
+        await _upload_started(upload_id, filename)
+    split_job = await _start_split_job(upload_id, filename)
+    if split_job is None:
+        return
+    with open(partial_path, "rb") as f:
+        while block := await asyncio.to_thread(f.read, RESUMABLE_BLOCK_SIZE):
+            await split_job.feed(block)
+
+
+async def _suspend_upload_session(upload_id: str, filename: str):
+    """Stop the split job of a resumable upload nobody is sending to; the next PUT restarts it."""
+    global current_upload_id, current_upload_info
+    upload_session_activity.pop(upload_id, None)
+    await _discard_split_job(upload_id)
+    ingesting_books.discard(upload_id)
+    upload_started_at.pop(upload_id, None)
+    _last_receiving_broadcast.pop(upload_id, None)
+    if current_upload_id == upload_id:
         current_upload_id = None
         current_upload_info = None
+    await broadcast_progress({"type": "upload_idle", "upload_id": upload_id, "filename": filename})
+
+
+@app.get("/uploads/{upload_id}")
+async def get_upload_session(upload_id: str, session_token: Optional[str] = Cookie(None)):
+    """Return the committed offset of a resumable upload."""
+    session = await _get_upload_session(upload_id, session_token)
+    return _upload_session_state(session)
+
+
+@app.put("/uploads/{upload_id}")
+async def put_upload_range(upload_id: str, request: Request,
+                           session_token: Optional[str] = Cookie(None)):
+    """Append a byte range at the offset given in the Upload-Offset header."""
+    session = await _get_upload_session(upload_id, session_token)
+    lock = upload_session_locks.setdefault(upload_id, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(409, "Another request is writing to this upload")
+
+    async with lock:
+        state = _upload_session_state(session)
+        try:
+            offset = int(request.headers["upload-offset"])
+        except (KeyError, ValueError):
+            raise HTTPException(400, "Upload-Offset header required")
+        if offset != state["offset"]:
+            raise HTTPException(409, f"Offset mismatch: committed offset is {state['offset']}")
+
+        partial_path = UPLOAD_DIR / f"{upload_id}.part"
+        written = offset
+        buffer = bytearray()
+        try:
+            if upload_id not in upload_session_activity:
+                await _activate_upload_session(upload_id, session["filename"], partial_path)
+            with open(partial_path, "ab") as out:
+                split_job = upload_split_jobs.get(upload_id)
+
+                async def flush():
+                    nonlocal written
+                    block = bytes(buffer)
+                    await asyncio.to_thread(out.write, block)
+                    written += len(block)
+                    buffer.clear()
+                    upload_session_activity[upload_id] = time.monotonic()
+                    if split_job is not None:
+                        await split_job.feed(block)
+                    await _upload_receiving(upload_id, session["filename"], written, session["size"])
+
+                async for chunk in request.stream():
+                    if written + len(buffer) + len(chunk) > session["size"]:
+                        raise HTTPException(413, "Range exceeds declared upload size")
+                    buffer.extend(chunk)
+                    if len(buffer) >= RESUMABLE_BLOCK_SIZE:
+                        await flush()
+                if buffer:
+                    await flush()
+        except UploadCancelled:
+            await _abandon_upload_session(upload_id, session["filename"])
+            raise HTTPException(410, "Upload cancelled")
+
+    return {"upload_id": upload_id, "offset": written, "size": session["size"]}
+
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload_session(upload_id: str, session_token: Optional[str] = Cookie(None)):
+    """Complete a resumable upload and split it into chunks."""
+    session = await _get_upload_session(upload_id, session_token)
+    lock = upload_session_locks.setdefault(upload_id, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(409, "Another request is writing to this upload")
+
+    async with lock:
+        state = _upload_session_state(session)
+        if state["offset"] != session["size"]:
+            raise HTTPException(409, f"Upload incomplete: {state['offset']}/{session['size']} bytes")
+
+        filename = session["filename"]
+        file_path = UPLOAD_DIR / f"{upload_id}_{filename}"
+        (UPLOAD_DIR / f"{upload_id}.part").replace(file_path)
+        await db.delete_upload_session(upload_id)
+        upload_session_locks.pop(upload_id, None)
+        upload_session_activity.pop(upload_id, None)
+
+    if current_upload_id != upload_id:
+        await _upload_started(upload_id, filename)
+    sha256 = await asyncio.to_thread(_sha256_file, file_path)
+    return await ingest_upload(upload_id, filename, file_path, session["size"], sha256)
+
+
+@app.delete("/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str, session_token: Optional[str] = Cookie(None)):
+    """Abandon a resumable upload and discard its partial data."""
+    session = await _get_upload_session(upload_id, session_token)
+    await _abandon_upload_session(upload_id, session["filename"])
+    return {"status": "aborted", "upload_id": upload_id}
+
+
+async def _abandon_upload_session(upload_id: str, filename: str):
+    """Delete a resumable upload with its partial file and anything split from it."""
+    await db.delete_upload_session(upload_id)
+    upload_session_locks.pop(upload_id, None)
+    upload_session_activity.pop(upload_id, None)
+    await _discard_split_job(upload_id)
+    ingesting_books.discard(upload_id)
+    upload_started_at.pop(upload_id, None)
+    _cleanup_upload(upload_id, None)
+    await broadcast_progress({"type": "upload_cancelled", "upload_id": upload_id, "filename": filename})
+
+
+async def sweep_upload_sessions():
+    """
+    Background loop deleting resumable uploads older than UPLOAD_SESSION_TTL
+    and suspending those that received nothing for UPLOAD_IDLE_SECONDS.
+    """
+    while True:
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL)
+        now = time.monotonic()
+        for upload_id, last_data in list(upload_session_activity.items()):
+            lock = upload_session_locks.setdefault(upload_id, asyncio.Lock())
+            if now - last_data < UPLOAD_IDLE_SECONDS or lock.locked():
+                continue
+            async with lock:
+                session = await db.get_upload_session(upload_id)
+                if session is None:
+                    upload_session_activity.pop(upload_id, None)
+                elif upload_session_activity.get(upload_id) == last_data:
+                    print(f"[UPLOAD] Resumable upload {upload_id} idle, split job stopped")
+                    await _suspend_upload_session(upload_id, session["filename"])
+        try:
+            expired = await db.get_expired_upload_sessions(UPLOAD_SESSION_TTL)
+        except Exception as e:
+            print(f"[UPLOAD] Session sweep failed: {e}")
+            continue
+        for session in expired:
+            upload_id = session["upload_id"]
+            lock = upload_session_locks.setdefault(upload_id, asyncio.Lock())
+            if lock.locked():
+                continue  # Receiving or finalizing right now
+            async with lock:
+                if await db.get_upload_session(upload_id) is None:
+                    continue  # Finalized or aborted meanwhile
+                print(f"[UPLOAD] Resumable upload {upload_id} ({session['filename']}) expired")
+                await _abandon_upload_session(upload_id, session["filename"])
+                await db.add_log("book", f"Upload {session['filename']} expired before it was finished")
 
 
 @app.post("/upload/{upload_id}/pause-chunking")
@@ -518,89 +1077,182 @@ async def pause_upload_when_ready(upload_id: str, session_token: Optional[str] =
 @app.get("/tasks")
 async def list_tasks():
     """List all tasks with their status."""
-    return db.get_all_tasks()
+    return await db.get_all_tasks()
 
 
 @app.get("/tasks/next")
-async def get_next_task(worker_id: str):
-    """Get next available task for a worker."""
-    task = db.get_next_pending_task()
-    if not task:
-        return {"task": None}
-
-    # Mark as in progress
-    db.assign_task(task["id"], worker_id)
+async def get_next_task(worker_id: str, model: Optional[str] = None,
+                        language: Optional[str] = None, params: Optional[str] = None):
+    """Get next available task for a worker.
+
+    Workers that send their decoding profile (model, language, params) never
+    receive chunks whose audio already has a cached transcript for that
+    profile; those are completed from the cache instead.
+    """
+    return {"task": await _assign_task(worker_id, model, language, params)}
+
+
+@app.get("/tasks/lease")
+async def lease_tasks(worker_id: str, n: int = 1, model: Optional[str] = None,
+                      language: Optional[str] = None, params: Optional[str] = None):
+    """Lease up to n tasks (at most MAX_LEASE_BATCH) for a worker's local queue.
+
+    The worker must report each task over its WebSocket ("started") when it
+    begins it. Tasks it will not run should be handed back via /tasks/release.
+    """
+    tasks = []
+    for _ in range(max(1, min(n, MAX_LEASE_BATCH))):
+        # A speculative copy is only worth it if the worker has nothing else to do
+        task = await _assign_task(worker_id, model, language, params,
+                                  queued=True, speculate=not tasks)
+        if not task:
+            break
+        tasks.append(task)
+        if task.get("speculative"):
+            break
+    return {"tasks": tasks}
+
+
+@app.post("/tasks/release")
+async def release_tasks(data: TaskRelease):
+    """Hand back leased tasks a worker will not run, so others can take them."""
+    released = await db.release_tasks(data.worker_id, data.task_ids)
+    if released:
+        print(f"[LEASE] {data.worker_id} released {len(released)} task(s)")
+        dispatch_wakeup.set()
+    return {"released": released}
+
+
+async def _assign_task(worker_id: str, model: Optional[str], language: Optional[str],
+                       params: Optional[str], queued: bool = False,
+                       speculate: bool = True) -> Optional[dict]:
+    """Claim a task for a worker, completing chunks with a cached transcript on the way."""
+    while True:
+        task = await db.claim_next_task(worker_id, queued=queued, speculate=speculate)
+        if not task:
+            return None
+        if not model or not task["fingerprint"]:
+            break
+        cached = await transcript_cache.lookup(task["fingerprint"],
+                                               task["end_time"] - task["start_time"],
+                                               profile_key(model, language, params))
+        if cached is None:
+            break
+        # Completed under the claimer's own lease, so it is released rather than cancelled
+        await _record_completion(task["id"], worker_id, cached, 0.0, task["lease_token"])
 
     await broadcast_progress({
         "type": "task_assigned",
         "task_id": task["id"],
         "worker_id": worker_id,
         "book_id": task["book_id"],
-        "chunk_id": task["chunk_id"]
+        "chunk_id": task["chunk_id"],
+        "speculative": task.get("speculative", False),
     })
-
-    return {"task": task}
+    return task
 
 
 @app.get("/chunks/{chunk_filename}")
-async def download_chunk(chunk_filename: str):
-    """Download an audio chunk."""
+async def download_chunk(chunk_filename: str, request: Request):
+    """Download an audio chunk, whole or by byte range (for resuming)."""
     chunk_path = CHUNKS_DIR / chunk_filename
     if not chunk_path.exists():
         raise HTTPException(404, "Chunk not found")
-    return FileResponse(chunk_path)
+    task = await db.get_task(chunk_path.stem)
+    if task and task["chunk_sha256"]:
+        etag = task["chunk_sha256"]
+    else:
+        stat = chunk_path.stat()
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    return file_response(request, chunk_path, etag)
 
 
 @app.post("/tasks/complete")
 async def complete_task(data: TaskComplete):
     """Mark a task as complete and store the transcript."""
-    db.complete_task(
-        task_id=data.task_id,
-        worker_id=data.worker_id,
-        transcript=data.transcript,
-        processing_time=data.processing_time
+    task = await _record_completion(data.task_id, data.worker_id, data.transcript,
+                                    data.processing_time, data.lease_token)
+    if task is None:
+        raise HTTPException(404, "Task not found (book deleted)")
+    if task.get("fenced"):
+        raise HTTPException(409, "Lease expired; the task was reassigned")
+    if task["worker_id"] != data.worker_id:
+        # Another copy of this chunk finished first
+        return {"status": "duplicate"}
+
+    # A retry of a result that was already kept must not store it again
+    if task["won"] and data.model and task["fingerprint"]:
+        await transcript_cache.store(task["fingerprint"], task["end_time"] - task["start_time"],
+                                     profile_key(data.model, data.language, data.params),
+                                     data.transcript)
+
+    return {"status": "ok"}
+
+
+async def _record_completion(task_id: str, worker_id: str, transcript: dict,
+                             processing_time: float, lease_token: int) -> Optional[dict]:
+    """Store a chunk transcript and merge the book once every chunk is done.
+
+    Only the first result for a chunk counts, and only from a worker whose
+    lease is still valid; workers still running other copies are told to cancel.
+    Returns the task (with "won" set if this result was the one kept, and
+    "fenced" if the lease was stale), or None.
+    """
+    result = await db.complete_task(
+        task_id=task_id,
+        worker_id=worker_id,
+        transcript=transcript,
+        processing_time=processing_time,
+        lease_token=lease_token
     )
 
+    task = await db.get_task(task_id)
+    if task is None:
+        return None
+    task = {**task, "won": result["won"], "fenced": result["fenced"]}
+    if not result["won"]:
+        return task
+    for other in result["cancel"]:
+        await _send_to_worker(other, {"type": "cancel", "task_id": task_id})
+
     # Check if book is complete
-    task = db.get_task(data.task_id)
-    book_status = db.get_book_status(task["book_id"])
+    book_status = await db.get_book_status(task["book_id"])
 
     await broadcast_progress({
         "type": "task_completed",
-        "task_id": data.task_id,
-        "worker_id": data.worker_id,
+        "task_id": task_id,
+        "worker_id": worker_id,
         "book_id": task["book_id"],
         "chunk_id": task["chunk_id"],
-        "processing_time": data.processing_time,
+        "processing_time": processing_time,
         "book_progress": book_status
     })
 
-    # If book is complete, merge results
-    if book_status["completed"] == book_status["total"]:
+    # If book is complete, merge results (unless more chunks are still being cut)
+    if book_status["completed"] == book_status["total"] and task["book_id"] not in ingesting_books:
         await merge_book_results(task["book_id"])
 
-    return {"status": "ok"}
+    return task
 
 
 async def merge_book_results(book_id: str):
     """Merge all chunk transcripts into final result."""
-    tasks = db.get_book_tasks(book_id)
+    tasks = await db.get_book_tasks(book_id)
 
     # Sort by start time
     tasks.sort(key=lambda t: t["start_time"])
 
-    # Merge segments
-    all_segments = []
-    offset = 0
+    # Merge segments (de-duplicating any overlap between neighbouring chunks)
+    chunk_transcripts = []
     for task in tasks:
         if task["transcript"]:
             transcript = json.loads(task["transcript"]) if isinstance(task["transcript"], str) else task["transcript"]
-            for seg in transcript.get("segments", []):
-                all_segments.append({
-                    "start": seg["start"] + task["start_time"],
-                    "end": seg["end"] + task["start_time"],
-                    "text": seg["text"]
-                })
+            chunk_transcripts.append({
+                "start_time": task["start_time"],
+                "end_time": task["end_time"],
+                "segments": transcript.get("segments", []),
+            })
+    all_segments = merge_chunk_segments(chunk_transcripts)
 
     # Create final result
     result = {
@@ -648,7 +1300,7 @@ async def merge_book_results(book_id: str):
     except Exception as e:
         print(f"Failed to delete upload file: {e}")
 
-    db.add_log("system", f"Cleanup: {chunks_deleted} chunks + {uploads_deleted} uploads deleted for book {book_id}")
+    await db.add_log("system", f"Cleanup: {chunks_deleted} chunks + {uploads_deleted} uploads deleted for book {book_id}")
 
     await broadcast_progress({
         "type": "book_completed",
@@ -662,7 +1314,7 @@ async def merge_book_results(book_id: str):
 async def get_result(book_id: str):
     """Download completed transcript."""
     # Look up the book in the DB to get its original filename
-    books = db.get_all_books()
+    books = await db.get_all_books()
     book = next((b for b in books if b["book_id"] == book_id), None)
     if not book:
         raise HTTPException(404, "Book not found")
@@ -678,7 +1330,7 @@ async def get_result(book_id: str):
 async def get_audio_result(book_id: str):
     """Download the full audio file."""
     # Look up the book in the DB to get its original filename
-    books = db.get_all_books()
+    books = await db.get_all_books()
     book = next((b for b in books if b["book_id"] == book_id), None)
     if not book:
         raise HTTPException(404, "Book not found")
@@ -696,8 +1348,25 @@ async def get_status():
     """Get overall system status."""
     return {
         "workers": list(connected_clients.keys()),
-        "tasks": db.get_status_summary(),
-        "books": db.get_all_books(),
+        "tasks": await db.get_status_summary(),
+        "books": await db.get_all_books(),
+        "db": db.stats(),
+        "scheduler": db.scheduling_policy,
+        "ffmpeg": ffmpeg_scheduler.stats(),
+        "transcript_cache": await transcript_cache.stats(),
+        "dispatch": {
+            **dispatch_metrics,
+            "waiting_workers": sum(1 for entry in worker_slots.values() if entry["slots"] > 0),
+            "unacked": len(unacked_tasks),
+        },
+        "ingest": {
+            "books": ingest_metrics["books"],
+            "last_time_to_first_task": ingest_metrics["last_time_to_first_task"],
+            "avg_time_to_first_task": (
+                round(ingest_metrics["total_time_to_first_task"] / ingest_metrics["books"], 2)
+                if ingest_metrics["books"] else None
+            ),
+        },
         "paths": {
             "results": str(RESULTS_DIR.absolute()),
             "chunks": str(CHUNKS_DIR.absolute()),
@@ -706,6 +1375,30 @@ async def get_status():
     }
 
 
+class SchedulerPolicy(BaseModel):
+    policy: str
+
+
+@app.get("/scheduler")
+async def get_scheduler():
+    """Current task scheduling policy and the available ones."""
+    return {"policy": db.scheduling_policy, "policies": list(SCHEDULING_POLICIES)}
+
+
+@app.post("/scheduler")
+async def set_scheduler(data: SchedulerPolicy, session_token: Optional[str] = Cookie(None)):
+    """Switch the task scheduling policy (fifo, fair, srpt). Requires admin auth."""
+    user = get_current_user(session_token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        await db.set_scheduling_policy(data.policy)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    await db.add_log("system", f"Scheduling policy set to {data.policy}")
+    return {"policy": data.policy}
+
+
 # ----- Torrent/Magnet Endpoints -----
 
 class MagnetLink(BaseModel):
@@ -747,7 +1440,7 @@ async def add_magnet(data: MagnetLink, session_token: Optional[str] = Cookie(Non
             if add_resp.status_code != 200:
                 raise HTTPException(status_code=500, detail="Failed to add torrent")
         
-        db.add_log("system", f"Added magnet link to qBittorrent")
+        await db.add_log("system", f"Added magnet link to qBittorrent")
         await broadcast_progress({"type": "magnet_added", "magnet": magnet[:50] + "..."})
         
         return {"status": "ok", "message": "Torrent added to qBittorrent"}
@@ -813,7 +1506,7 @@ async def check_book_exists(filename: str, session_token: Optional[str] = Cookie
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
         
-    exists = db.check_book_exists(filename)
+    exists = await db.check_book_exists(filename)
     return {"exists": exists, "filename": filename}
 
 
@@ -824,12 +1517,35 @@ async def pause_book(book_id: str, session_token: Optional[str] = Cookie(None)):
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    db.pause_book(book_id)
+    await db.pause_book(book_id)
     await broadcast_progress({"type": "book_paused", "book_id": book_id})
-    db.add_log("book", f"Book {book_id} paused")
+    await db.add_log("book", f"Book {book_id} paused")
     return {"status": "paused", "book_id": book_id}
 
 
+class BookPriority(BaseModel):
+    priority: Optional[int] = None  # Higher runs first
+    weight: Optional[float] = None  # Share of workers relative to other books
+
+
+@app.post("/books/{book_id}/priority")
+async def set_book_priority(book_id: str, data: BookPriority,
+                            session_token: Optional[str] = Cookie(None)):
+    """Set a book's scheduling priority and/or fair-share weight. Requires admin auth."""
+    user = get_current_user(session_token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if data.weight is not None and data.weight <= 0:
+        raise HTTPException(400, "weight must be positive")
+
+    if not await db.set_book_priority(book_id, data.priority, data.weight):
+        raise HTTPException(404, "Book not found")
+    await broadcast_progress({"type": "book_priority", "book_id": book_id,
+                              "priority": data.priority, "weight": data.weight})
+    await db.add_log("book", f"Book {book_id} priority={data.priority} weight={data.weight}")
+    return {"status": "ok", "book_id": book_id, "priority": data.priority, "weight": data.weight}
+
+
 @app.post("/books/{book_id}/resume")
 async def resume_book(book_id: str, session_token: Optional[str] = Cookie(None)):
     """Resume processing of a specific book. Requires admin auth."""
@@ -837,9 +1553,10 @@ async def resume_book(book_id: str, session_token: Optional[str] = Cookie(None))
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    db.resume_book(book_id)
+    await db.resume_book(book_id)
+    dispatch_wakeup.set()
     await broadcast_progress({"type": "book_resumed", "book_id": book_id})
-    db.add_log("book", f"Book {book_id} resumed")
+    await db.add_log("book", f"Book {book_id} resumed")
     return {"status": "resumed", "book_id": book_id}
 
 
@@ -851,7 +1568,7 @@ async def delete_book(book_id: str, session_token: Optional[str] = Cookie(None))
         raise HTTPException(status_code=401, detail="Authentication required")
     
     # Get chunk paths and delete from database
-    chunk_paths = db.delete_book(book_id)
+    chunk_paths = await db.delete_book(book_id)
     
     # Delete chunk files
     for chunk_path in chunk_paths:
@@ -861,7 +1578,7 @@ async def delete_book(book_id: str, session_token: Optional[str] = Cookie(None))
             pass
     
     await broadcast_progress({"type": "book_deleted", "book_id": book_id})
-    db.add_log("book", f"Book {book_id} deleted")
+    await db.add_log("book", f"Book {book_id} deleted")
     return {"status": "deleted", "book_id": book_id}
 
 
@@ -873,7 +1590,7 @@ async def delete_all_books(session_token: Optional[str] = Cookie(None)):
         raise HTTPException(status_code=401, detail="Authentication required")
     
     # 1. Clear database and get chunk paths
-    chunk_paths = db.delete_all_books()
+    chunk_paths = await db.delete_all_books()
     
     # 2. Delete all chunk files
     for chunk_path in chunk_paths:
@@ -899,7 +1616,7 @@ async def delete_all_books(session_token: Optional[str] = Cookie(None)):
                 pass
 
     await broadcast_progress({"type": "books_cleared"})
-    db.add_log("system", "All audiobooks and history deleted")
+    await db.add_log("system", "All audiobooks and history deleted")
     return {"status": "all_deleted"}
 
 
@@ -907,20 +1624,50 @@ async def delete_all_books(session_token: Optional[str] = Cookie(None)):
 @app.post("/workers/register")
 async def register_worker(data: WorkerRegister):
     """Register a new worker."""
-    db.register_worker(data.worker_id, data.hostname)
+    await db.register_worker(data.worker_id, data.hostname, data.hardware, data.model, data.rtf)
     await broadcast_progress({
         "type": "worker_joined",
         "worker_id": data.worker_id,
-        "hostname": data.hostname
+        "hostname": data.hostname,
+        "hardware": data.hardware,
+        "model": data.model,
+        "rtf": data.rtf,
     })
     return {"status": "registered"}
 
 
 @app.post("/workers/{worker_id}/heartbeat")
 async def worker_heartbeat(worker_id: str):
-    """Worker heartbeat to track active workers."""
-    db.worker_heartbeat(worker_id)
-    return {"status": "ok"}
+    """Worker heartbeat to track active workers and renew their task leases.
+
+    Returns the leases the worker still holds; a task missing from the list
+    was reassigned and should be abandoned.
+    """
+    await db.worker_heartbeat(worker_id)
+    return {"status": "ok", "leases": await db.renew_leases(worker_id)}
+
+
+async def sweep_expired_leases():
+    """Background loop returning tasks with expired leases to the queue."""
+    interval = max(1.0, db.lease_ttl / 6)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = await db.expire_leases()
+        except Exception as e:
+            print(f"[LEASE] Sweep failed: {e}")
+            continue
+        if expired:
+            dispatch_wakeup.set()
+        for lease in expired:
+            print(f"[LEASE] {lease['worker_id']} lost task {lease['task_id']} (lease expired)")
+            await _send_to_worker(lease["worker_id"],
+                                  {"type": "cancel", "task_id": lease["task_id"]})
+            await broadcast_progress({
+                "type": "lease_expired",
+                "task_id": lease["task_id"],
+                "worker_id": lease["worker_id"],
+            })
 
 
 @app.websocket("/ws/dashboard")
@@ -932,10 +1679,10 @@ async def dashboard_websocket(websocket: WebSocket):
     # Send current status including recent logs and current upload (so refresh shows it)
     init_payload = {
         "type": "init",
-        "status": db.get_status_summary(),
-        "books": db.get_all_books(),
-        "workers": db.get_active_workers(),
-        "logs": db.get_recent_logs(100)
+        "status": await db.get_status_summary(),
+        "books": await db.get_all_books(),
+        "workers": await db.get_active_workers(),
+        "logs": await db.get_recent_logs(100)
     }
     if current_upload_info is not None:
         init_payload["current_upload"] = current_upload_info
@@ -949,6 +1696,77 @@ async def dashboard_websocket(websocket: WebSocket):
         dashboard_clients.remove(websocket)
 
 
+async def dispatch_loop():
+    """Background loop pushing tasks to WebSocket workers that have free slots.
+
+    Woken whenever tasks may have become available (new chunk, released or
+    expired lease, resumed book) or a worker asks for work; otherwise runs
+    every DISPATCH_INTERVAL seconds to pick up speculative copies.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(dispatch_wakeup.wait(), DISPATCH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        dispatch_wakeup.clear()
+        try:
+            await _dispatch_tasks()
+            await _revoke_unacked()
+        except Exception as e:
+            print(f"[DISPATCH] Dispatch pass failed: {e}")
+
+
+async def _dispatch_tasks():
+    """Hand out tasks round-robin, one per waiting worker per round."""
+    waiting = [w for w, entry in worker_slots.items() if entry["slots"] > 0]
+    while waiting:
+        for worker_id in list(waiting):
+            entry = worker_slots.get(worker_id)
+            ws = connected_clients.get(worker_id)
+            task = None
+            if entry and entry["slots"] > 0 and ws is not None:
+                # A speculative copy is only worth it if the worker has nothing else to do
+                task = await _assign_task(worker_id, *entry["profile"], queued=True,
+                                          speculate=entry["idle"])
+            if task is None:
+                waiting.remove(worker_id)
+                continue
+            entry["slots"] -= 1
+            entry["idle"] = False
+            unacked_tasks[task["id"]] = (worker_id, time.monotonic() + DISPATCH_ACK_TIMEOUT)
+            try:
+                await ws.send_json({"type": "assign", "task": task})
+                dispatch_metrics["pushed"] += 1
+            except Exception as e:
+                print(f"[DISPATCH] Could not push {task['id']} to {worker_id}: {e}")
+                unacked_tasks.pop(task["id"], None)
+                await db.release_tasks(worker_id, [task["id"]])
+                waiting.remove(worker_id)
+
+
+async def _revoke_unacked(worker_id: str = None):
+    """Return pushed tasks that were never acknowledged (or all of worker_id's) to the queue."""
+    now = time.monotonic()
+    for task_id, (holder, deadline) in list(unacked_tasks.items()):
+        if holder == worker_id or (worker_id is None and deadline < now):
+            del unacked_tasks[task_id]
+            if await db.release_tasks(holder, [task_id]):
+                dispatch_metrics["revoked"] += 1
+                print(f"[DISPATCH] {holder} did not acknowledge {task_id}; requeued")
+                dispatch_wakeup.set()
+
+
+async def _send_to_worker(worker_id: str, message: dict):
+    """Send a control message to a worker over its WebSocket, if connected."""
+    ws = connected_clients.get(worker_id)
+    if ws is None:
+        return
+    try:
+        await ws.send_json(message)
+    except Exception as e:
+        print(f"[WS] Could not reach worker {worker_id}: {e}")
+
+
 @app.websocket("/ws/worker/{worker_id}")
 async def worker_websocket(websocket: WebSocket, worker_id: str):
     """WebSocket endpoint for worker communication."""
@@ -963,7 +1781,27 @@ async def worker_websocket(websocket: WebSocket, worker_id: str):
     try:
         while True:
             data = await websocket.receive_json()
-            if data.get("type") == "progress":
+            if data.get("type") == "ready":
+                worker_slots[worker_id] = {
+                    "slots": int(data.get("slots", 1)),
+                    "idle": bool(data.get("idle", False)),
+                    "profile": (data.get("model"), data.get("language"), data.get("params")),
+                }
+                dispatch_wakeup.set()
+            elif data.get("type") == "ack":
+                task_id = data.get("task_id")
+                if unacked_tasks.pop(task_id, None):
+                    dispatch_metrics["acked"] += 1
+                else:
+                    # Acknowledged too late: make sure the lease was not revoked
+                    leases = await db.renew_leases(worker_id, task_id)
+                    if all(lease["task_id"] != task_id for lease in leases):
+                        await websocket.send_json({"type": "cancel", "task_id": task_id})
+            elif data.get("type") == "started":
+                await db.start_task(data.get("task_id"), worker_id)
+            elif data.get("type") == "progress":
+                if data.get("task_id"):
+                    await db.renew_leases(worker_id, data["task_id"])
                 await broadcast_progress({
                     "type": "chunk_progress",
                     "worker_id": worker_id,
@@ -972,6 +1810,8 @@ async def worker_websocket(websocket: WebSocket, worker_id: str):
                 })
     except WebSocketDisconnect:
         del connected_clients[worker_id]
+        worker_slots.pop(worker_id, None)
+        await _revoke_unacked(worker_id)
         await broadcast_progress({
             "type": "worker_disconnected",
             "worker_id": worker_id
@@ -0,0 +1,55 @@
+"""
+Tests for chunk boundaries and the chunks a split returns.
+"""
+
+import asyncio
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from audio_splitter import AudioSplitter, plan_cut_points
+
+
+def test_cuts_move_to_nearby_pauses():
+    cuts = plan_cut_points(100, 20, [(21, 22), (39, 40), (61, 62)], window=5)
+    assert cuts == [21.5, 39.5, 61.5, 80]
+
+
+def test_cuts_snapping_to_one_pause_leave_no_sliver_chunk():
+    # The cuts at 3 and 6 both reach the pause around 5
+    cuts = plan_cut_points(10, 3, [(4.99, 5.0001)], window=2)
+    bounds = [0, *cuts, 10]
+    assert all(b - a >= 1.5 for a, b in zip(bounds, bounds[1:-1]))
+
+
+def test_no_cut_at_end_of_file():
+    assert plan_cut_points(100, 20, [], window=0) == [20, 40, 60, 80]
+
+
+@pytest.fixture
+def short_audio(tmp_path):
+    """25 s of audio, probed as 45 s (as ffprobe may for a VBR MP3 without a Xing header)."""
+    path = tmp_path / "book.mp3"
+    subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", "sine=f=440:d=25",
+                    "-b:a", "48k", str(path)], check=True)
+    return path
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+@pytest.mark.parametrize("engine,overlap", [("segment", 0), ("per_chunk", 0), ("per_chunk", 2)])
+def test_chunks_past_the_real_end_are_not_returned(tmp_path, short_audio, engine, overlap):
+    splitter = AudioSplitter(tmp_path / "chunks", chunk_duration=10, engine=engine,
+                             overlap=overlap)
+
+    async def overestimated_probe(_path):
+        return {"duration": 45.0, "chapters": []}
+
+    splitter._run_ffprobe = overestimated_probe
+    chunks = asyncio.run(splitter.split_audio(short_audio, "book"))
+
+    assert [c["chunk_id"] for c in chunks] == ["chunk_0000", "chunk_0001", "chunk_0002"]
+    assert all(Path(c["path"]).stat().st_size > 0 for c in chunks)
+    assert chunks[-1]["end"] <= 45.0
+    assert sorted(p.name for p in (tmp_path / "chunks").iterdir()) == [c["filename"] for c in chunks]
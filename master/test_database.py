@@ -0,0 +1,73 @@
+"""
+Tests for task claiming in the SQLite task database.
+"""
+
+import threading
+
+from database import Database
+
+THREADS = 16
+CHUNKS = 300
+
+
+def make_db(tmp_path, **kwargs) -> Database:
+    return Database(db_path=str(tmp_path / "tasks.db"), **kwargs)
+
+
+def add_book(db: Database, book_id: str, chunks: int, duration: float = 60.0):
+    for i in range(chunks):
+        db.create_task(book_id, f"chunk_{i:04d}", f"/chunks/{book_id}_chunk_{i:04d}.mp3",
+                       i * duration, (i + 1) * duration, f"{book_id}.mp3")
+
+
+def test_concurrent_claims_hand_out_each_chunk_once(tmp_path):
+    db = make_db(tmp_path, speculate_last_n=0)
+    add_book(db, "book", CHUNKS)
+    claims = []
+    claims_lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+
+    def claim_all(worker_id):
+        start.wait()
+        while True:
+            task = db.claim_next_task(worker_id)
+            if task is None:
+                return
+            with claims_lock:
+                claims.append((task["id"], worker_id))
+
+    threads = [threading.Thread(target=claim_all, args=(f"worker-{n}",)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.close()
+
+    claimed = [task_id for task_id, _ in claims]
+    assert len(claimed) == CHUNKS
+    assert len(set(claimed)) == CHUNKS
+
+
+def test_claim_assigns_task_to_worker(tmp_path):
+    db = make_db(tmp_path)
+    add_book(db, "book", 1)
+    task = db.claim_next_task("worker-1")
+    assert task["status"] == "in_progress"
+    assert task["worker_id"] == "worker-1"
+    assert task["lease_token"] is not None
+    assert db.claim_next_task("worker-2", speculate=False) is None
+    db.close()
+
+
+def test_completion_releases_the_completers_lease(tmp_path):
+    db = make_db(tmp_path)
+    add_book(db, "book", 1)
+    first = db.claim_next_task("worker-1")
+    # As for a chunk completed from the transcript cache right after the claim
+    result = db.complete_task(first["id"], "worker-1", {}, 0.0, first["lease_token"])
+    assert result == {"won": True, "fenced": False, "cancel": []}
+    assert db._get_conn().execute("SELECT COUNT(*) FROM task_leases").fetchone()[0] == 0
+    # A retry of the same result is neither kept again nor fenced
+    retry = db.complete_task(first["id"], "worker-1", {}, 0.0, first["lease_token"])
+    assert retry == {"won": False, "fenced": False, "cancel": []}
+    db.close()
@@ -0,0 +1,94 @@
+"""
+Discrete-event simulation of chunk scheduling against the real claim query.
+
+Four workers transcribe at 10x real time while a 40 h book is queued first
+and six short books arrive over the next 20 minutes. Fair sharing and
+shortest-remaining-first must beat upload order on mean book completion time.
+"""
+
+import heapq
+
+import pytest
+
+from database import Database
+
+CHUNK_SECONDS = 1200.0
+RTF = 0.1  # A worker transcribes a 20 min chunk in 2 min
+WORKERS = 4
+# (arrival seconds, chunks): a 40 h book first, then smaller books
+BOOKS = [(0, 120), (60, 6), (120, 9), (300, 3), (600, 12), (900, 5), (1200, 8)]
+
+
+def simulate(tmp_path, policy: str, priorities: dict = None) -> list[float]:
+    """Seconds from arrival to completion for each book in BOOKS."""
+    db = Database(db_path=str(tmp_path / f"{policy}.db"), policy=policy, speculate_last_n=0)
+    events = []  # (time, kind, seq, data); arrivals (kind 0) before completions
+    for i, (arrival, chunks) in enumerate(BOOKS):
+        heapq.heappush(events, (arrival, 0, i, (f"book{i}", chunks)))
+    idle = [f"worker{i}" for i in range(WORKERS)]
+    finished = {}
+    seq = 0
+    while events:
+        now, kind, _, data = heapq.heappop(events)
+        if kind == 0:
+            book_id, chunks = data
+            for c in range(chunks):
+                db.create_task(book_id, f"chunk_{c:04d}", f"{book_id}_chunk_{c:04d}.mp3",
+                               c * CHUNK_SECONDS, (c + 1) * CHUNK_SECONDS, f"{book_id}.mp3")
+            if priorities and book_id in priorities:
+                db.set_book_priority(book_id, priorities[book_id])
+        else:
+            worker_id, task = data
+            db.complete_task(task["id"], worker_id, {}, 0.0, task["lease_token"])
+            status = db.get_book_status(task["book_id"])
+            if status["completed"] == status["total"]:
+                finished[task["book_id"]] = now
+            idle.append(worker_id)
+        while idle:
+            task = db.claim_next_task(idle[-1])
+            if task is None:
+                break
+            seq += 1
+            duration = (task["end_time"] - task["start_time"]) * RTF
+            heapq.heappush(events, (now + duration, 1, seq, (idle.pop(), task)))
+    db.close()
+    return [finished[f"book{i}"] - arrival for i, (arrival, _) in enumerate(BOOKS)]
+
+
+def mean(values: list[float]) -> float:
+    return sum(values) / len(values)
+
+
+@pytest.fixture(scope="module")
+def fifo_turnaround(tmp_path_factory):
+    return simulate(tmp_path_factory.mktemp("fifo"), "fifo")
+
+
+@pytest.mark.parametrize("policy", ["fair", "srpt"])
+def test_policy_beats_fifo_on_mean_completion(tmp_path, fifo_turnaround, policy):
+    turnaround = simulate(tmp_path, policy)
+    assert mean(turnaround) < 0.5 * mean(fifo_turnaround)
+    # The long book is slowed down, but still finishes
+    assert turnaround[0] < 1.5 * fifo_turnaround[0]
+
+
+def test_srpt_finishes_short_books_first(tmp_path):
+    turnaround = simulate(tmp_path, "srpt")
+    assert max(turnaround[1:]) < turnaround[0]
+
+
+def test_priority_overrides_policy(tmp_path, fifo_turnaround):
+    # book3 arrives behind the 40 h book; with priority it no longer waits for it
+    turnaround = simulate(tmp_path, "fifo", priorities={"book3": 5})
+    assert turnaround[3] < 0.1 * fifo_turnaround[3]
+
+
+def test_priority_only_for_existing_books(tmp_path):
+    db = Database(db_path=str(tmp_path / "tasks.db"))
+    db.create_task("book", "chunk_0000", "book_chunk_0000.mp3", 0, 60, "book.mp3")
+    assert db.set_book_priority("book", priority=3)
+    assert db.set_book_priority("book", weight=2.0)
+    assert not db.set_book_priority("typo", priority=3)
+    rows = db._get_conn().execute("SELECT book_id, priority, weight FROM books").fetchall()
+    assert [tuple(row) for row in rows] == [("book", 3, 2.0)]
+    db.close()
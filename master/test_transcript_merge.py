@@ -0,0 +1,87 @@
+"""
+Regression fixtures for merging overlapping chunk transcripts, built from
+synthetic transcripts of a known word sequence.
+"""
+
+import random
+
+import pytest
+
+from transcript_merge import merge_chunk_segments
+
+WORD_SECONDS = 0.5
+VOCABULARY = ("the", "a", "and", "of", "to", "she", "said", "house", "river", "night",
+              "went", "down", "old", "man", "light", "door", "long", "road", "again", "was")
+
+
+def source_words(count: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(count)]
+
+
+def chunk_transcript(words: list[str], start: float, end: float, words_per_segment: int,
+                     phase: int = 0, garble_head: bool = False,
+                     garble_tail: bool = False) -> dict:
+    """What Whisper would return for the words heard in [start, end)."""
+    heard = [(i, w) for i, w in enumerate(words) if start <= (i + 0.5) * WORD_SECONDS < end]
+    texts = [w for _, w in heard]
+    if garble_head:
+        texts[0] = "mmh"  # Word cut off by the chunk boundary
+    if garble_tail:
+        texts[-1] = "whuh"
+    segments = []
+    groups = [texts[:phase]] if phase else []
+    groups += [texts[n:n + words_per_segment] for n in range(phase, len(texts), words_per_segment)]
+    first = heard[0][0]
+    for group in groups:
+        seg_start = first * WORD_SECONDS - start
+        first += len(group)
+        segments.append({"start": seg_start, "end": first * WORD_SECONDS - start,
+                         "text": " " + " ".join(group)})
+    return {"start_time": start, "end_time": end, "segments": segments}
+
+
+def merged_words(chunks: list[dict]) -> list[str]:
+    return [w for seg in merge_chunk_segments(chunks) for w in seg["text"].split()]
+
+
+def test_chunks_without_overlap_merge_in_order():
+    words = source_words(120)
+    chunks = [chunk_transcript(words, 0, 30, 7), chunk_transcript(words, 30, 60, 5)]
+    assert merged_words(list(reversed(chunks))) == words
+
+
+@pytest.mark.parametrize("tail_segment", [3, 5, 8, 13, 40])
+@pytest.mark.parametrize("head_segment", [3, 5, 8, 13, 40])
+def test_overlap_with_misaligned_segments(tail_segment, head_segment):
+    words = source_words(120)
+    chunks = [
+        chunk_transcript(words, 0, 35, tail_segment, phase=2, garble_tail=True),
+        chunk_transcript(words, 25, 60, head_segment, phase=1, garble_head=True),
+    ]
+    assert merged_words(chunks) == words
+
+
+def test_three_chunks_each_overlapping_the_next():
+    words = source_words(180, seed=7)
+    chunks = [
+        chunk_transcript(words, 0, 35, 6, garble_tail=True),
+        chunk_transcript(words, 25, 65, 9, phase=4, garble_head=True, garble_tail=True),
+        chunk_transcript(words, 55, 90, 4, garble_head=True),
+    ]
+    assert merged_words(chunks) == words
+
+
+def test_overlap_without_common_words_splits_at_seam():
+    tail = {"start_time": 0, "end_time": 40, "segments": [
+        {"start": 0, "end": 20, "text": " chapter one"},
+        {"start": 31, "end": 33, "text": " music"},
+        {"start": 37, "end": 39, "text": " more music"},
+    ]}
+    head = {"start_time": 30, "end_time": 60, "segments": [
+        {"start": 2, "end": 4, "text": " humming"},
+        {"start": 8, "end": 9, "text": " chapter two"},
+        {"start": 15, "end": 25, "text": " it began"},
+    ]}
+    texts = [seg["text"].strip() for seg in merge_chunk_segments([tail, head])]
+    assert texts == ["chapter one", "music", "chapter two", "it began"]
@@ -0,0 +1,122 @@
+"""
+Chunk-level transcript cache.
+
+Re-encoded or re-tagged copies of the same audiobook decode to nearly the
+same audio, so their chunks can reuse each other's transcripts. Each chunk
+gets a fingerprint of its decoded audio: one bit per FRAME_SECONDS frame,
+set when the frame is louder than the one before it. Loudness contours
+survive re-encoding, so two chunks match when their fingerprints differ in
+at most MAX_BIT_ERROR of their bits. Cached transcripts are keyed by that
+fingerprint plus the decoding profile (model, language, parameters) that
+produced them, and evicted least-recently-used beyond max_entries. Lookups
+only compare entries sharing a band of the fingerprint (see
+database.fingerprint_bands), so their cost does not grow with the cache.
+"""
+
+import asyncio
+import re
+from pathlib import Path
+
+from ffmpeg_scheduler import PRIORITY_FINGERPRINT, FFmpegScheduler
+
+FRAME_SECONDS = 0.5
+FRAME_RATE = 8000  # Sample rate the fingerprint is computed at
+MAX_BIT_ERROR = 0.1  # Fraction of differing bits still considered the same audio
+DURATION_TOLERANCE = 2.0  # Seconds two matching chunks may differ in length
+MIN_FINGERPRINT_BITS = 20  # Shorter chunks match too easily to be cached
+
+RMS_RE = re.compile(r"RMS_level=(-?[\d.]+|-inf)")
+
+
+def fingerprint_bits(rms_levels: list[float]) -> str:
+    """Loudness contour as a '0'/'1' string: 1 where a frame is louder than the previous."""
+    return "".join("1" if b > a else "0" for a, b in zip(rms_levels, rms_levels[1:]))
+
+
+def bit_error(a: str, b: str) -> float:
+    """Fraction of differing bits over the shorter fingerprint (1.0 if either is empty)."""
+    n = min(len(a), len(b))
+    if n == 0:
+        return 1.0
+    return sum(x != y for x, y in zip(a[:n], b[:n])) / n
+
+
+async def fingerprint_audio(audio_path: Path, scheduler: FFmpegScheduler) -> str:
+    """Decode an audio file and return its loudness-contour fingerprint."""
+    frame_samples = int(FRAME_RATE * FRAME_SECONDS)
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-i", str(audio_path),
+        "-vn",
+        "-af", (f"aresample={FRAME_RATE},asetnsamples=n={frame_samples}:p=0,"
+                "astats=metadata=1:reset=1:measure_overall=RMS_level:measure_perchannel=none,"
+                "ametadata=print:key=lavfi.astats.Overall.RMS_level:file=-"),
+        "-f", "null", "-",
+    ]
+    async with scheduler.slot(PRIORITY_FINGERPRINT):
+        proc = await asyncio.create_subprocess_exec(
+            *scheduler.command(cmd, PRIORITY_FINGERPRINT),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"Fingerprinting failed: {stderr.decode(errors='replace')[-500:]}")
+
+    levels = [float(m) for m in RMS_RE.findall(stdout.decode())]
+    return fingerprint_bits(levels)
+
+
+def profile_key(model: str, language: str = None, params: str = None) -> str:
+    """Decoding profile a transcript was produced with."""
+    return f"{model}|{language or 'auto'}|{params or ''}"
+
+
+class TranscriptCache:
+    def __init__(self, db, max_entries: int = 5000):
+        """
+        Args:
+            db: AsyncDatabase holding the transcript_cache table
+            max_entries: Cached transcripts kept before evicting the least recently used
+                (0 disables the cache)
+        """
+        self.db = db
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def usable(self, fingerprint: str) -> bool:
+        return self.enabled and fingerprint is not None and len(fingerprint) >= MIN_FINGERPRINT_BITS
+
+    async def lookup(self, fingerprint: str, duration: float, profile: str):
+        """Cached transcript for matching audio decoded with this profile, or None."""
+        if not self.usable(fingerprint):
+            return None
+        # Candidates are narrowed by fingerprint band and compared on the DB executor
+        transcript = await self.db.match_cached_transcript(
+            fingerprint, profile, duration, DURATION_TOLERANCE, bit_error, MAX_BIT_ERROR)
+        if transcript is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return transcript
+
+    async def store(self, fingerprint: str, duration: float, profile: str, transcript: dict):
+        if not self.usable(fingerprint):
+            return
+        await self.db.save_cached_transcript(fingerprint, duration, profile, transcript,
+                                             self.max_entries)
+
+    async def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": await self.db.count_cached_transcripts(),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+        }
@@ -0,0 +1,89 @@
+"""
+Merging of per-chunk transcripts into one book transcript.
+
+Chunks may overlap (AudioSplitter's `overlap` option): the tail of one chunk
+is transcribed again at the head of the next. The words both chunks heard in
+the shared region are aligned, and the merged text takes the earlier chunk up
+to the end of the longest agreeing run and the later chunk after it, so no
+words are lost or duplicated at the seam.
+"""
+
+import difflib
+import re
+
+MIN_SEAM_WORDS = 2  # Shorter agreeing runs are too likely to be coincidence
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r"[^\w']", "", word).lower()
+
+
+def _keep_words(segments: list[dict], keep) -> list[dict]:
+    """Rebuild segments keeping only the words whose running index satisfies keep(i)."""
+    result = []
+    index = 0
+    for seg in segments:
+        words = seg["text"].split()
+        kept = [w for n, w in enumerate(words) if keep(index + n)]
+        index += len(words)
+        if kept:
+            result.append({**seg, "text": " " + " ".join(kept)})
+    return result
+
+
+def _reconcile_seam(tail: list[dict], head: list[dict], seam: float) -> list[dict]:
+    """Merge the earlier chunk's segments (tail) with the later chunk's (head) over their overlap."""
+    tail_words = [_normalize(w) for seg in tail for w in seg["text"].split()]
+    head_words = [_normalize(w) for seg in head for w in seg["text"].split()]
+    matcher = difflib.SequenceMatcher(None, tail_words, head_words, autojunk=False)
+    block = max(matcher.get_matching_blocks(), key=lambda b: b.size)
+
+    if block.size < MIN_SEAM_WORDS:
+        # Nothing to align on (e.g. silence or music): split by time at the seam
+        return ([s for s in tail if (s["start"] + s["end"]) / 2 < seam]
+                + [s for s in head if (s["start"] + s["end"]) / 2 >= seam])
+
+    tail_end = block.a + block.size
+    head_start = block.b + block.size
+    return (_keep_words(tail, lambda i: i < tail_end)
+            + _keep_words(head, lambda i: i >= head_start))
+
+
+def merge_chunk_segments(chunks: list[dict]) -> list[dict]:
+    """
+    Combine chunk transcripts into book-relative segments.
+
+    Args:
+        chunks: [{"start_time", "end_time", "segments"}] with segment times
+            relative to their chunk, in any order.
+    Returns segments with absolute times, in order, without overlap duplicates.
+    """
+    chunks = sorted(chunks, key=lambda c: c["start_time"])
+    merged = []
+    previous_end = None
+
+    for chunk in chunks:
+        offset = chunk["start_time"]
+        segments = [
+            {"start": seg["start"] + offset, "end": seg["end"] + offset, "text": seg["text"]}
+            for seg in chunk.get("segments", [])
+        ]
+
+        if previous_end is not None and previous_end > offset:
+            # Segments of each chunk that fall in the shared region
+            split = len(merged)
+            while split > 0 and merged[split - 1]["end"] > offset:
+                split -= 1
+            tail = merged[split:]
+            del merged[split:]
+            head_len = 0
+            while head_len < len(segments) and segments[head_len]["start"] < previous_end:
+                head_len += 1
+            seam = (offset + previous_end) / 2
+            merged.extend(_reconcile_seam(tail, segments[:head_len], seam))
+            segments = segments[head_len:]
+
+        merged.extend(segments)
+        previous_end = chunk["end_time"]
+
+    return merged
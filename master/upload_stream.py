@@ -0,0 +1,121 @@
+"""
+Streaming multipart receiver for audiobook uploads.
+
+Parses the request body as it arrives and writes the file part to disk in
+fixed-size blocks, hashing it on the fly, so master memory stays flat no
+matter how large the audiobook is.
+"""
+
+import asyncio
+import hashlib
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+BLOCK_SIZE = 1024 * 1024  # Bytes buffered before each disk write
+
+
+async def receive_file(request: Request, dest_path: Path, field_name: str = "file",
+                       on_started=None, on_progress=None, on_block=None) -> dict:
+    """
+    Stream the `field_name` file part of a multipart request to dest_path.
+
+    Args:
+        on_started: Optional async callback(filename) once the part headers arrive.
+        on_progress: Optional async callback(received_bytes, total_bytes) after each
+            block is written; total_bytes is the request Content-Length (0 if unknown).
+        on_block: Optional async callback(block) with each block as it is written.
+    Returns {"filename", "path", "size", "sha256"}.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(400, "Expected multipart/form-data upload")
+    total_bytes = int(request.headers.get("content-length") or 0)
+
+    headers: dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    part = {"is_file": False, "filename": None, "started": False}
+    buffer = bytearray()
+    sha256 = hashlib.sha256()
+    state = {"size": 0, "done": False}
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = disposition.get(b"filename")
+        part["is_file"] = (name == field_name and filename is not None
+                           and not state["done"])
+        if part["is_file"]:
+            part["filename"] = Path(filename.decode("utf-8", errors="replace")).name
+        headers.clear()
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            buffer.extend(data[start:end])
+
+    def on_part_end():
+        if part["is_file"]:
+            state["done"] = True
+            part["is_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    out = open(dest_path, "wb")
+    try:
+        async def flush(force: bool = False):
+            if not buffer or (len(buffer) < BLOCK_SIZE and not force):
+                return
+            block = bytes(buffer)
+            buffer.clear()
+            sha256.update(block)
+            await asyncio.to_thread(out.write, block)
+            state["size"] += len(block)
+            if on_block:
+                await on_block(block)
+            if on_progress:
+                await on_progress(state["size"], total_bytes)
+
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if part["filename"] and not part["started"]:
+                part["started"] = True
+                if on_started:
+                    await on_started(part["filename"])
+            await flush(force=state["done"])
+        parser.finalize()
+        await flush(force=True)
+    finally:
+        out.close()
+
+    if not part["filename"]:
+        dest_path.unlink(missing_ok=True)
+        raise HTTPException(400, f"Missing '{field_name}' file field")
+
+    return {
+        "filename": part["filename"],
+        "path": dest_path,
+        "size": state["size"],
+        "sha256": sha256.hexdigest(),
+    }
@@ -3,6 +3,7 @@ Folder Watcher for Whisper Swarm
 Monitors qBittorrent download folder and uploads completed audiobooks to master server.
 """
 
+import hashlib
 import json
 import os
 import time
@@ -23,6 +24,12 @@ ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "changeme")
 # Persisted list of files we've already processed (relative paths, normalized)
 PROCESSED_STATE_FILE = Path(__file__).parent / "processed_files.json"
 
+# Resumable upload sessions in flight (file key -> upload_id), so an interrupted
+# transfer continues from the master's committed offset after a restart
+UPLOAD_SESSIONS_FILE = Path(__file__).parent / "upload_sessions.json"
+UPLOAD_BLOCK_SIZE = 8 * 1024 * 1024  # Bytes per PUT
+UPLOAD_MAX_RETRIES = 8  # Consecutive failed PUTs before giving up
+
 # Audio file extensions to watch for
 AUDIO_EXTENSIONS = {'.mp3', '.m4a', '.m4b', '.wav', '.flac', '.ogg', '.opus', '.aac'}
 
@@ -53,6 +60,36 @@ def save_processed_paths(paths: set) -> None:
     PROCESSED_STATE_FILE.write_text(json.dumps(data, indent=2), encoding="utf-8")
 
 
+def load_upload_sessions() -> dict:
+    """Load in-flight resumable upload sessions from disk."""
+    if not UPLOAD_SESSIONS_FILE.exists():
+        return {}
+    try:
+        return json.loads(UPLOAD_SESSIONS_FILE.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def save_upload_sessions(sessions: dict) -> None:
+    """Persist in-flight resumable upload sessions to disk."""
+    UPLOAD_SESSIONS_FILE.write_text(json.dumps(sessions, indent=2), encoding="utf-8")
+
+
+def _upload_key(file_path: Path) -> str:
+    """Identify a file version so a changed file never resumes a stale session."""
+    stat = file_path.stat()
+    return f"{file_path.resolve()}|{stat.st_size}|{int(stat.st_mtime)}"
+
+
+def _sha256_file(file_path: Path) -> str:
+    """Content hash sent with new upload sessions so the master can skip known audio."""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
 class AudiobookHandler(FileSystemEventHandler):
     """Handles new audio files appearing in the watch folder."""
 
@@ -61,6 +98,7 @@ class AudiobookHandler(FileSystemEventHandler):
         self.session_token = None
         self.pending_files = set()  # Files waiting for download to complete
         self.processed_paths = load_processed_paths()
+        self.upload_sessions = load_upload_sessions()
         
     def login(self) -> bool:
         """Login to master server and get session token."""
@@ -83,40 +121,98 @@ class AudiobookHandler(FileSystemEventHandler):
             print(f"[ERROR] Login error: {e}")
             return False
     
+    def _request(self, client: httpx.Client, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send an authenticated request, re-logging in once if the session expired."""
+        resp = client.request(method, url, cookies={"session_token": self.session_token}, **kwargs)
+        if resp.status_code == 401:
+            print("[WARN] Session expired, re-logging in...")
+            if self.login():
+                resp = client.request(method, url, cookies={"session_token": self.session_token}, **kwargs)
+        return resp
+
     def upload_file(self, file_path: Path) -> bool:
-        """Upload an audio file to the master server."""
+        """Upload an audio file to the master server using the resumable upload API."""
         if not self.session_token:
             if not self.login():
                 return False
-        
+
         print(f"[UPLOADING] {file_path.name}")
-        
+
         try:
-            with httpx.Client(timeout=300) as client:
-                with open(file_path, 'rb') as f:
-                    files = {'file': (file_path.name, f, 'audio/mpeg')}
-                    resp = client.post(
-                        f"{MASTER_URL}/upload",
-                        files=files,
-                        cookies={"session_token": self.session_token}
-                    )
-                
+            key = _upload_key(file_path)
+            size = file_path.stat().st_size
+            with httpx.Client(timeout=120) as client:
+                upload_id = self.upload_sessions.get(key)
+                offset = None
+                if upload_id:
+                    resp = self._request(client, "GET", f"{MASTER_URL}/uploads/{upload_id}")
+                    if resp.status_code == 200:
+                        offset = resp.json()["offset"]
+                        print(f"[RESUME] {file_path.name} from {offset / (1024 * 1024):.1f} MB")
+                if offset is None:
+                    resp = self._request(client, "POST", f"{MASTER_URL}/uploads",
+                                         json={"filename": file_path.name, "size": size,
+                                               "sha256": _sha256_file(file_path)})
+                    if resp.status_code == 200 and resp.json().get("duplicate_of"):
+                        print(f"[SKIP] Same audio as book {resp.json()['duplicate_of']}: {file_path.name}")
+                        return True
+                    if resp.status_code != 201:
+                        print(f"[ERROR] Upload failed: {resp.status_code} - {resp.text}")
+                        return False
+                    upload_id = resp.json()["upload_id"]
+                    offset = 0
+                    self.upload_sessions[key] = upload_id
+                    save_upload_sessions(self.upload_sessions)
+
+                failures = 0
+                with open(file_path, "rb") as f:
+                    while offset < size:
+                        f.seek(offset)
+                        block = f.read(UPLOAD_BLOCK_SIZE)
+                        try:
+                            resp = self._request(client, "PUT", f"{MASTER_URL}/uploads/{upload_id}",
+                                                 content=block, headers={"Upload-Offset": str(offset)})
+                        except httpx.RequestError as e:
+                            resp = None
+                            print(f"[RETRY] Upload interrupted at {offset} bytes: {e}")
+                        if resp is not None and resp.status_code == 200:
+                            offset = resp.json()["offset"]
+                            failures = 0
+                            continue
+                        if resp is not None and resp.status_code in (404, 410):
+                            # Session gone (cancelled or master wiped): start over next time
+                            print(f"[ERROR] Upload session lost: {resp.status_code}")
+                            self.upload_sessions.pop(key, None)
+                            save_upload_sessions(self.upload_sessions)
+                            return False
+                        failures += 1
+                        if failures > UPLOAD_MAX_RETRIES:
+                            print(f"[ERROR] Giving up after {failures} failed attempts; will resume later")
+                            return False
+                        time.sleep(min(2 ** failures, 60))
+                        # Re-sync with whatever the master actually committed
+                        try:
+                            resp = self._request(client, "GET", f"{MASTER_URL}/uploads/{upload_id}")
+                            if resp.status_code == 200:
+                                offset = resp.json()["offset"]
+                        except httpx.RequestError:
+                            pass
+
+                # Splitting happens during finalize, so allow it more time
+                resp = self._request(client, "POST", f"{MASTER_URL}/uploads/{upload_id}/finalize",
+                                     timeout=600)
                 if resp.status_code == 200:
+                    self.upload_sessions.pop(key, None)
+                    save_upload_sessions(self.upload_sessions)
                     print(f"[OK] Uploaded: {file_path.name}")
                     return True
-                elif resp.status_code == 401:
-                    print("[WARN] Session expired, re-logging in...")
-                    if self.login():
-                        return self.upload_file(file_path)  # Retry
-                    return False
-                else:
-                    print(f"[ERROR] Upload failed: {resp.status_code} - {resp.text}")
-                    return False
-                    
+                print(f"[ERROR] Upload failed: {resp.status_code} - {resp.text}")
+                return False
+
         except Exception as e:
             print(f"[ERROR] Upload error: {e}")
             return False
-    
+
     def is_file_ready(self, file_path: Path) -> bool:
         """Check if file is fully downloaded (not being written to)."""
         try:
@@ -4,24 +4,67 @@ Connects to master server, downloads audio chunks, transcribes, and uploads resu
 """
 
 import asyncio
+import hashlib
+import io
 import json
 import os
 import platform
+import random
 import socket
 import sys
+import threading
 import time
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import httpx
 import websockets
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
 
 # Configuration
 WORKER_ID = f"worker-{uuid.uuid4().hex[:6]}"
 HOSTNAME = socket.gethostname()
 TEMP_DIR = Path.home() / ".stt_worker" / "temp"
+STATS_FILE = Path.home() / ".stt_worker" / "stats.json"  # Measured speed, kept across runs
+RTF_SMOOTHING = 0.3  # Weight of the newest chunk in the real-time factor average
+QUEUE_AHEAD_SECONDS = 60  # Work leased beyond the current chunk, so the model never waits
+MAX_QUEUE = 8  # Most tasks held at once
+PREFETCH_CHUNKS = 2  # Downloaded chunks waiting for the model
+UPLOAD_BACKLOG = 4  # Finished transcripts waiting to be submitted
+STATS_EVERY = 10  # Print pipeline metrics every this many chunks
+PUSH_WAIT = 30  # Seconds an idle worker waits for pushed tasks before asking again
+POLL_FALLBACK_SECONDS = 60  # Lease over HTTP at least this often even while tasks are pushed
+PROGRESS_INTERVAL = 2  # Most often (seconds) progress is streamed to master
+# Chunks whose decoded audio (16 kHz mono float32, 64 KB per second) fits in
+# this many MB are downloaded into memory and decoded straight to an array for
+# Whisper; longer ones are spilled to TEMP_DIR. 100 MB covers 20-minute chunks.
+MEMORY_AUDIO_MAX_BYTES = int(float(os.environ.get("WORKER_MEMORY_AUDIO_MB", 100)) * 1024 * 1024)
+DECODED_BYTES_PER_SECOND = 16000 * 4
+DOWNLOAD_BLOCK = 1024 * 1024  # Bytes written to disk at a time while downloading
+DOWNLOAD_ATTEMPTS = 5  # Tries (resuming where the last stopped) before giving up on a chunk
+HTTP_RETRIES = 4  # Extra attempts for a failed request to master
+RETRY_BASE_DELAY = 0.5  # Seconds; backoff doubles per attempt, with full jitter
+RETRY_MAX_DELAY = 15
+RETRY_STATUSES = {502, 503, 504}  # Proxy/tunnel hiccups worth retrying
+HEARTBEAT_INTERVAL = 30  # Seconds; also renews task leases, so keep well under the master's TTL
 MODEL_SIZE = os.environ.get("WHISPER_MODEL", "base")  # tiny, base, small, medium, large
+LANGUAGE = "en"  # Change if needed or set to None for auto-detect
+BEAM_SIZE = 5
+VAD_FILTER = True
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx: pip install httpx[http2])
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+# Decoding profile sent to the master so cached transcripts are only reused
+# for identical settings
+PROFILE = {
+    "model": MODEL_SIZE,
+    "language": LANGUAGE or "auto",
+    "params": f"beam_size={BEAM_SIZE},vad_filter={int(VAD_FILTER)}",
+}
 
 
 class STTWorker:
@@ -29,8 +72,36 @@ class STTWorker:
         self.master_url = master_url.rstrip("/")
         self.ws_url = self.master_url.replace("http://", "ws://").replace("https://", "wss://")
         self.model = None
+        self.device = None
+        self.compute_type = None
         self.ws = None
         self.running = True
+        self.current_task_id = None
+        self.cancelled = set()  # Task ids the master told us to drop
+        self.leases = {}  # task_id -> lease token for tasks we hold
+        # Pipeline: leased tasks -> download -> downloaded -> transcribe -> finished -> upload
+        self.queue = deque()  # Leased tasks not downloaded yet
+        # Audio is a decoded numpy array, or the Path of a chunk spilled to disk
+        self.downloaded = asyncio.Queue(maxsize=PREFETCH_CHUNKS)  # (task, audio)
+        self.finished = asyncio.Queue(maxsize=UPLOAD_BACKLOG)  # (task, spill Path or None, transcript, seconds)
+        self.stages = {}  # Per-stage {"count", "busy"} since the last report
+        self.window_started = None  # When the current metrics window began
+        self.chunk_seconds = None  # Audio length of recent chunks
+        self.task_arrived = asyncio.Event()  # Set when master pushes an assignment
+        self.last_poll = time.monotonic()  # Last HTTP lease or pushed assignment
+        # One pooled, keep-alive client for every call to master (HTTP/2 over TLS
+        # when available), so chunks do not pay a new TCP/TLS handshake each
+        self.http = httpx.AsyncClient(
+            base_url=self.master_url,
+            http2=HTTP2,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=8,
+                                keepalive_expiry=120),
+        )
+        self.http_stats = {"requests": 0, "connections": 0, "retries": 0, "versions": {}}
+        # Whisper runs here, off the event loop, one chunk at a time
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+        self.rtf = self._load_rtf()
 
         TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -39,15 +110,15 @@ class STTWorker:
         print(f"Loading Whisper model '{MODEL_SIZE}'...")
 
         # Use GPU if available (CUDA), otherwise CPU
-        device = "cuda" if self._has_cuda() else "cpu"
-        compute_type = "float16" if device == "cuda" else "int8"
+        self.device = "cuda" if self._has_cuda() else "cpu"
+        self.compute_type = "float16" if self.device == "cuda" else "int8"
 
         self.model = WhisperModel(
             MODEL_SIZE,
-            device=device,
-            compute_type=compute_type
+            device=self.device,
+            compute_type=self.compute_type
         )
-        print(f"Model loaded on {device}")
+        print(f"Model loaded on {self.device}")
 
     def _has_cuda(self) -> bool:
         """Check if CUDA is available."""
@@ -57,14 +128,93 @@ class STTWorker:
         except ImportError:
             return False
 
+    def _gpu_name(self) -> str | None:
+        try:
+            import torch
+            return torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+        except ImportError:
+            return None
+
+    def _load_rtf(self) -> float | None:
+        """Real-time factor measured on this machine in earlier runs."""
+        try:
+            stats = json.loads(STATS_FILE.read_text())
+        except (OSError, ValueError):
+            return None
+        return stats.get(MODEL_SIZE, {}).get("rtf")
+
+    def _record_rtf(self, processing_time: float, audio_duration: float):
+        """Fold one chunk's speed into the persisted real-time factor."""
+        if audio_duration <= 0:
+            return
+        sample = processing_time / audio_duration
+        self.rtf = sample if self.rtf is None else self.rtf * (1 - RTF_SMOOTHING) + sample * RTF_SMOOTHING
+        try:
+            stats = json.loads(STATS_FILE.read_text())
+        except (OSError, ValueError):
+            stats = {}
+        stats[MODEL_SIZE] = {"rtf": round(self.rtf, 4), "device": self.device}
+        STATS_FILE.write_text(json.dumps(stats, indent=2))
+
+    async def request(self, method: str, path: str, retry: bool = True, **kwargs) -> httpx.Response:
+        """
+        Send a request to master over the shared client.
+
+        Connection errors and RETRY_STATUSES are retried up to HTTP_RETRIES
+        times with jittered exponential backoff (retry=False for requests that
+        must not be repeated).
+        """
+        attempts = 1 + (HTTP_RETRIES if retry else 0)
+        for attempt in range(attempts):
+            try:
+                resp = await self.http.request(method, path, extensions={"trace": self._trace},
+                                               **kwargs)
+                self._count_response(resp)
+                if resp.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return resp
+            except httpx.TransportError:
+                if attempt == attempts - 1:
+                    raise
+            self.http_stats["retries"] += 1
+            await asyncio.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+
+    def _count_response(self, resp: httpx.Response):
+        self.http_stats["requests"] += 1
+        versions = self.http_stats["versions"]
+        versions[resp.http_version] = versions.get(resp.http_version, 0) + 1
+
+    async def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.http_stats["connections"] += 1
+
+    def http_report(self) -> str:
+        """How many requests went out and how many reused an open connection."""
+        stats = self.http_stats
+        reused = 1 - stats["connections"] / stats["requests"] if stats["requests"] else 0
+        versions = "/".join(sorted(stats["versions"])) or "none"
+        return (f"{stats['requests']} requests over {stats['connections']} connection(s) "
+                f"({reused:.0%} reused, {versions}), {stats['retries']} retries")
+
     async def register(self):
-        """Register with the master server."""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            await client.post(
-                f"{self.master_url}/workers/register",
-                json={"worker_id": WORKER_ID, "hostname": HOSTNAME}
-            )
-        print(f"Registered as {WORKER_ID} ({HOSTNAME})")
+        """Register with the master server, reporting hardware and measured speed."""
+        await self.request(
+            "POST", "/workers/register",
+            json={
+                "worker_id": WORKER_ID,
+                "hostname": HOSTNAME,
+                "hardware": {
+                    "device": self.device,
+                    "compute_type": self.compute_type,
+                    "gpu": self._gpu_name(),
+                    "cpu_count": os.cpu_count(),
+                    "platform": platform.platform(),
+                },
+                "model": MODEL_SIZE,
+                "rtf": self.rtf,
+            }
+        )
+        rtf = f"{self.rtf:.3f}" if self.rtf is not None else "not measured yet"
+        print(f"Registered as {WORKER_ID} ({HOSTNAME}, {self.device}, RTF {rtf})")
 
     async def connect_websocket(self):
         """Connect to master via WebSocket for progress updates."""
@@ -75,6 +225,26 @@ class STTWorker:
             print(f"WebSocket connection failed: {e}")
             self.ws = None
 
+    async def listen(self):
+        """Handle control messages from the master: pushed tasks and cancellations."""
+        if not self.ws:
+            return
+        try:
+            async for raw in self.ws:
+                message = json.loads(raw)
+                if message.get("type") == "assign":
+                    self.enqueue(message["task"])
+                    self.last_poll = time.monotonic()  # Pushes are flowing; no HTTP lease needed
+                    await self.ws.send(json.dumps({"type": "ack", "task_id": message["task"]["id"]}))
+                    self.task_arrived.set()
+                elif message.get("type") == "cancel":
+                    self.cancelled.add(message["task_id"])
+                    if message["task_id"] == self.current_task_id:
+                        print(f"  Cancel received for {message['task_id']}")
+        except Exception as e:
+            print(f"WebSocket closed: {e}")
+        self.ws = None  # Fall back to HTTP polling
+
     async def send_progress(self, task_id: str, progress: float):
         """Send progress update to master."""
         if self.ws:
@@ -87,58 +257,250 @@ class STTWorker:
             except:
                 pass
 
-    async def heartbeat(self):
-        """Send periodic heartbeat to master."""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            while self.running:
-                try:
-                    await client.post(f"{self.master_url}/workers/{WORKER_ID}/heartbeat")
-                except:
-                    pass
-                await asyncio.sleep(30)
+    async def send_ready(self, slots: int) -> bool:
+        """Ask master to push up to `slots` more tasks. False if there is no WebSocket."""
+        if not self.ws:
+            return False
+        try:
+            await self.ws.send(json.dumps({
+                "type": "ready",
+                "slots": slots,
+                "idle": not self.leases,
+                **PROFILE
+            }))
+            return True
+        except Exception:
+            return False
 
-    async def get_next_task(self) -> dict | None:
-        """Get next available task from master."""
-        async with httpx.AsyncClient(timeout=60.0) as client:
+    async def send_started(self, task_id: str):
+        """Tell the master a queued task is now running."""
+        if self.ws:
             try:
-                resp = await client.get(
-                    f"{self.master_url}/tasks/next",
-                    params={"worker_id": WORKER_ID}
-                )
-                data = resp.json()
-                return data.get("task")
-            except Exception as e:
-                print(f"Error getting task: {e}")
-                return None
+                await self.ws.send(json.dumps({"type": "started", "task_id": task_id}))
+            except:
+                pass
 
-    async def download_chunk(self, chunk_path: str) -> Path:
-        """Download audio chunk from master."""
-        chunk_filename = Path(chunk_path).name
-        local_path = TEMP_DIR / chunk_filename
+    def heartbeat(self):
+        """
+        Send periodic heartbeats to master, renewing our task leases.
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.get(f"{self.master_url}/chunks/{chunk_filename}")
-            local_path.write_bytes(resp.content)
+        Runs in its own thread so leases stay alive even if the event loop
+        stalls. Tasks whose lease the master no longer lists
+        were reassigned and are dropped.
+        """
+        with httpx.Client(timeout=20.0) as client:
+            while self.running:
+                held = set(self.leases)
+                try:
+                    resp = client.post(f"{self.master_url}/workers/{WORKER_ID}/heartbeat")
+                    live = {lease["task_id"] for lease in resp.json().get("leases", [])}
+                    for task_id in held - live:
+                        if task_id in self.leases:
+                            print(f"  Lease on {task_id} expired, dropping it")
+                            self.cancelled.add(task_id)
+                except Exception:
+                    pass
+                time.sleep(HEARTBEAT_INTERVAL)
 
-        return local_path
+    def queue_size(self) -> int:
+        """Tasks to hold: the current one plus QUEUE_AHEAD_SECONDS of work at our speed."""
+        if not self.rtf or not self.chunk_seconds:
+            return 1
+        seconds_per_chunk = self.rtf * self.chunk_seconds
+        return max(1, min(MAX_QUEUE, 1 + int(QUEUE_AHEAD_SECONDS // seconds_per_chunk)))
 
-    def transcribe(self, audio_path: Path, task_id: str) -> dict:
-        """Transcribe audio using Whisper."""
+    async def lease_tasks(self, n: int) -> list[dict]:
+        """Lease up to n tasks from master."""
+        try:
+            # Not retried: a lost response would leave leases we do not know about
+            resp = await self.request(
+                "GET", "/tasks/lease", retry=False,
+                params={"worker_id": WORKER_ID, "n": n, **PROFILE}
+            )
+            return resp.json().get("tasks", [])
+        except Exception as e:
+            print(f"Error leasing tasks: {e}")
+            return []
+
+    async def refill(self):
+        """
+        Top the local queue up to queue_size().
+
+        With a WebSocket, master pushes the tasks (see listen); HTTP leasing is
+        the fallback when the socket is down, or when no task has been pushed
+        (nor a poll made) for POLL_FALLBACK_SECONDS in case pushes stop arriving.
+        """
+        wanted = self.queue_size() - len(self.leases)
+        if wanted <= 0:
+            return
+        if await self.send_ready(wanted) and time.monotonic() - self.last_poll < POLL_FALLBACK_SECONDS:
+            return
+        self.last_poll = time.monotonic()
+        for task in await self.lease_tasks(wanted):
+            self.enqueue(task)
+
+    def enqueue(self, task: dict):
+        """Add a leased task to the local queue for the download stage."""
+        self.leases[task["id"]] = task.get("lease_token")
+        self.chunk_seconds = task["end_time"] - task["start_time"]
+        self.queue.append(task)
+
+    async def release_queue(self):
+        """Hand back to master the tasks we hold but will not finish (on shutdown)."""
+        self.queue.clear()
+        while not self.downloaded.empty():
+            _, audio = self.downloaded.get_nowait()
+            self._discard_audio(audio)
+        await self.release_tasks(list(self.leases))
+
+    async def release_tasks(self, task_ids: list[str]):
+        """Give up our leases on these tasks so other workers can take them."""
+        for task_id in task_ids:
+            self.leases.pop(task_id, None)
+        if not task_ids:
+            return
+        try:
+            await self.request("POST", "/tasks/release", timeout=10.0,
+                               json={"worker_id": WORKER_ID, "task_ids": task_ids})
+            print(f"Released {len(task_ids)} task(s)")
+        except Exception as e:
+            print(f"Could not release tasks: {e}")
+
+    async def download_chunk(self, task: dict) -> bytes | Path:
+        """
+        Stream a task's chunk from master, into memory, or to TEMP_DIR if its
+        decoded audio would exceed MEMORY_AUDIO_MAX_BYTES.
+
+        An interrupted download resumes with a Range request from where it
+        stopped (If-Range on the ETag, so a changed file starts over). The
+        result is checked against the size and SHA-256 the master published
+        with the task; a mismatch discards it and downloads it again.
+        Returns the chunk's bytes, or the Path it was written to.
+        """
+        chunk_filename = Path(task["chunk_path"]).name
+        decoded_size = (task["end_time"] - task["start_time"]) * DECODED_BYTES_PER_SECOND
+        buffer = bytearray() if decoded_size <= MEMORY_AUDIO_MAX_BYTES else None
+        local_path = TEMP_DIR / chunk_filename
+        part_path = local_path.with_name(local_path.name + ".part")
+        part_path.unlink(missing_ok=True)
+        etag = None
+        error = None
+
+        def reset():
+            if buffer is not None:
+                buffer.clear()
+            else:
+                part_path.unlink(missing_ok=True)
+
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+            if buffer is not None:
+                offset = len(buffer)
+            else:
+                offset = part_path.stat().st_size if part_path.exists() else 0
+            headers = {}
+            if offset and etag:
+                headers = {"Range": f"bytes={offset}-", "If-Range": etag}
+            try:
+                async with self.http.stream("GET", f"/chunks/{chunk_filename}", headers=headers,
+                                            extensions={"trace": self._trace}) as resp:
+                    self._count_response(resp)
+                    if resp.status_code == 416:
+                        reset()  # What we have is not a prefix of the chunk
+                        continue
+                    resp.raise_for_status()
+                    etag = resp.headers.get("etag")
+                    if resp.status_code == 206 and not resp.headers.get(
+                            "content-range", "").startswith(f"bytes {offset}-"):
+                        reset()  # Not the range we asked for
+                        continue
+                    if resp.status_code != 206:
+                        reset()
+                    if buffer is not None:
+                        async for block in resp.aiter_bytes(DOWNLOAD_BLOCK):
+                            buffer.extend(block)
+                    else:
+                        with open(part_path, "ab") as f:
+                            async for block in resp.aiter_bytes(DOWNLOAD_BLOCK):
+                                await asyncio.to_thread(f.write, block)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRY_STATUSES:
+                    raise
+                error = e
+                self.http_stats["retries"] += 1
+                continue
+            except httpx.TransportError as e:
+                error = e  # Connection dropped mid-transfer: resume from what we have
+                self.http_stats["retries"] += 1
+                continue
+
+            content = bytes(buffer) if buffer is not None else part_path
+            error = await asyncio.to_thread(self._verify_download, content, task)
+            if error is None:
+                if buffer is not None:
+                    return content
+                part_path.replace(local_path)
+                return local_path
+            print(f"  {chunk_filename}: {error}, downloading again")
+            reset()
+
+        part_path.unlink(missing_ok=True)
+        raise RuntimeError(f"Could not download {chunk_filename}: {error}")
+
+    def _verify_download(self, content: bytes | Path, task: dict) -> str | None:
+        """Why a downloaded chunk does not match what master published, or None if it does."""
+        size = len(content) if isinstance(content, bytes) else content.stat().st_size
+        if task.get("chunk_size") is not None and size != task["chunk_size"]:
+            return f"got {size} bytes, expected {task['chunk_size']}"
+        if task.get("chunk_sha256"):
+            if isinstance(content, bytes):
+                digest = hashlib.sha256(content).hexdigest()
+            else:
+                sha256 = hashlib.sha256()
+                with open(content, "rb") as f:
+                    for block in iter(lambda: f.read(DOWNLOAD_BLOCK), b""):
+                        sha256.update(block)
+                digest = sha256.hexdigest()
+            if digest != task["chunk_sha256"]:
+                return "checksum mismatch"
+        return None
+
+    @staticmethod
+    def _discard_audio(audio):
+        if isinstance(audio, Path):
+            audio.unlink(missing_ok=True)
+
+    def transcribe(self, audio, task_id: str, loop: asyncio.AbstractEventLoop) -> dict:
+        """
+        Transcribe audio (decoded samples, or a file path) using Whisper.
+        Runs in the executor thread.
+
+        Stops after the current segment if the task is cancelled or the worker
+        shuts down, and streams progress to master through the event loop.
+        """
         segments_list = []
+        last_progress = time.monotonic()
 
         segments, info = self.model.transcribe(
-            str(audio_path),
-            beam_size=5,
-            language="en",  # Change if needed or set to None for auto-detect
-            vad_filter=True
+            str(audio) if isinstance(audio, Path) else audio,
+            beam_size=BEAM_SIZE,
+            language=LANGUAGE,
+            vad_filter=VAD_FILTER
         )
 
         for segment in segments:
+            if task_id in self.cancelled or not self.running:
+                break  # Finished elsewhere, lease lost, or shutting down
             segments_list.append({
                 "start": segment.start,
                 "end": segment.end,
                 "text": segment.text
             })
+            if info.duration and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                asyncio.run_coroutine_threadsafe(
+                    self.send_progress(task_id, min(1.0, segment.end / info.duration)), loop)
 
         return {
             "language": info.language,
@@ -149,46 +511,142 @@ class STTWorker:
 
     async def submit_result(self, task_id: str, transcript: dict, processing_time: float):
         """Submit transcription result to master."""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            await client.post(
-                f"{self.master_url}/tasks/complete",
-                json={
-                    "task_id": task_id,
-                    "worker_id": WORKER_ID,
-                    "transcript": transcript,
-                    "processing_time": processing_time
-                }
-            )
-
-    async def process_task(self, task: dict):
-        """Process a single task."""
-        task_id = task["id"]
-        chunk_path = task["chunk_path"]
-
-        print(f"\nProcessing task {task_id}")
-        print(f"  Chunk: {Path(chunk_path).name}")
-
-        # Download chunk
-        print("  Downloading chunk...")
-        local_path = await self.download_chunk(chunk_path)
-
-        # Transcribe
-        print("  Transcribing...")
-        start_time = time.time()
-        transcript = self.transcribe(local_path, task_id)
-        processing_time = time.time() - start_time
-
-        print(f"  Done in {processing_time:.1f}s")
-        print(f"  Segments: {len(transcript['segments'])}")
-
-        # Submit result
-        print("  Submitting result...")
-        await self.submit_result(task_id, transcript, processing_time)
-
-        # Cleanup
-        local_path.unlink(missing_ok=True)
+        lease_token = self.leases.get(task_id)
+        if lease_token is None:
+            print(f"  Result for {task_id} not sent: no lease on it")
+            return
+        # Safe to retry: a repeated completion is answered as a duplicate
+        resp = await self.request(
+            "POST", "/tasks/complete",
+            json={
+                "task_id": task_id,
+                "worker_id": WORKER_ID,
+                "transcript": transcript,
+                "processing_time": processing_time,
+                "lease_token": lease_token,
+                **PROFILE
+            }
+        )
+        if resp.status_code == 409:
+            print(f"  Result refused: lease on {task_id} expired and the task was reassigned")
 
-        print(f"  Task {task_id} complete!")
+    def _drop_if_cancelled(self, task_id: str, audio=None) -> bool:
+        """Forget a task the master cancelled (finished elsewhere or lease lost)."""
+        if task_id not in self.cancelled:
+            return False
+        self.cancelled.discard(task_id)
+        self.leases.pop(task_id, None)
+        self._discard_audio(audio)
+        print(f"  Task {task_id} dropped (finished elsewhere or lease lost)")
+        return True
+
+    def _record_stage(self, stage: str, seconds: float):
+        stats = self.stages.setdefault(stage, {"count": 0, "busy": 0.0})
+        stats["count"] += 1
+        stats["busy"] += seconds
+
+    def pipeline_report(self) -> str:
+        """Average time per chunk in each stage, and how busy the model was."""
+        parts = [f"{stage} {stats['busy'] / stats['count']:.1f}s"
+                 for stage, stats in self.stages.items() if stats["count"]]
+        elapsed = time.monotonic() - self.window_started
+        busy = self.stages.get("transcribe", {}).get("busy", 0.0)
+        return f"{', '.join(parts)} per chunk; model busy {busy / elapsed:.0%} of the time"
+
+    async def download_stage(self):
+        """Stage 1: lease tasks and download their chunks ahead of the model."""
+        while self.running:
+            if not self.queue:
+                self.task_arrived.clear()
+                await self.refill()
+                if not self.queue:
+                    # No tasks available: wait for a push, or poll again shortly
+                    try:
+                        await asyncio.wait_for(self.task_arrived.wait(), PUSH_WAIT if self.ws else 5)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+            task = self.queue.popleft()
+            if self._drop_if_cancelled(task["id"]):
+                continue
+            started = time.monotonic()
+            try:
+                audio = await self.download_chunk(task)
+                self._record_stage("download", time.monotonic() - started)
+                if isinstance(audio, bytes):
+                    # Decode once, here, so the model gets samples and never touches disk
+                    started = time.monotonic()
+                    audio = await asyncio.to_thread(decode_audio, io.BytesIO(audio))
+                    self._record_stage("decode", time.monotonic() - started)
+            except Exception as e:
+                print(f"Error fetching {task['id']}: {e}")
+                await self.release_tasks([task["id"]])
+                continue
+            await self.downloaded.put((task, audio))  # Waits while PREFETCH_CHUNKS are ready
+            del audio  # Held by the queue only, so transcription can free it
+            await self.refill()
+
+    async def transcribe_stage(self):
+        """Stage 2: run Whisper on downloaded chunks, one at a time."""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            audio = None  # Free the previous chunk's samples while waiting for the next
+            task, audio = await self.downloaded.get()
+            task_id = task["id"]
+            if self._drop_if_cancelled(task_id, audio):
+                continue
+
+            print(f"\nTranscribing task {task_id}" + (" (speculative copy)" if task.get("speculative") else ""))
+            print(f"  Chunk: {Path(task['chunk_path']).name}"
+                  + (" (from disk)" if isinstance(audio, Path) else ""))
+            self.current_task_id = task_id
+            await self.send_started(task_id)
+            if self.window_started is None:
+                self.window_started = time.monotonic()
+
+            started = time.monotonic()
+            transcript = await loop.run_in_executor(self.executor, self.transcribe,
+                                                    audio, task_id, loop)
+            processing_time = time.monotonic() - started
+            self.current_task_id = None
+            if not self.running:
+                self._discard_audio(audio)  # Interrupted; the lease is released on shutdown
+                break
+            if self._drop_if_cancelled(task_id, audio):
+                continue
+
+            self._record_stage("transcribe", processing_time)
+            self._record_rtf(processing_time, transcript["duration"])
+            print(f"  Done in {processing_time:.1f}s, {len(transcript['segments'])} segments")
+            if self.stages["transcribe"]["count"] >= STATS_EVERY:
+                print(f"  Pipeline: {self.pipeline_report()}")
+                print(f"  HTTP: {self.http_report()}")
+                self.stages = {}
+                self.window_started = None
+            # Decoded samples are dropped here rather than waiting for the upload
+            spill_path = audio if isinstance(audio, Path) else None
+            del audio
+            await self.finished.put((task, spill_path, transcript, processing_time))
+
+    async def upload_stage(self):
+        """Stage 3: submit finished transcripts in the background."""
+        while True:
+            task, spill_path, transcript, processing_time = await self.finished.get()
+            task_id = task["id"]
+            try:
+                if not self._drop_if_cancelled(task_id):
+                    started = time.monotonic()
+                    await self.submit_result(task_id, transcript, processing_time)
+                    self._record_stage("upload", time.monotonic() - started)
+                    print(f"  Task {task_id} complete!")
+                self.leases.pop(task_id, None)
+            except Exception as e:
+                print(f"Error submitting {task_id}: {e}")
+                await self.release_tasks([task_id])
+            finally:
+                self._discard_audio(spill_path)
+                self.finished.task_done()
 
     async def run(self):
         """Main worker loop."""
@@ -208,26 +666,38 @@ class STTWorker:
         await self.register()
         await self.connect_websocket()
 
-        # Start heartbeat task
-        heartbeat_task = asyncio.create_task(self.heartbeat())
+        # Start heartbeat thread and listen for control messages
+        threading.Thread(target=self.heartbeat, daemon=True).start()
+        listen_task = asyncio.create_task(self.listen())
 
         print("\nWaiting for tasks...")
+        stages = [
+            asyncio.create_task(self.download_stage()),
+            asyncio.create_task(self.transcribe_stage()),
+            asyncio.create_task(self.upload_stage()),
+        ]
 
         try:
-            while self.running:
-                task = await self.get_next_task()
-
-                if task:
-                    await self.process_task(task)
-                else:
-                    # No tasks available, wait before checking again
-                    await asyncio.sleep(5)
-
+            done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for stage in done:
+                stage.result()  # Re-raise the error that stopped the pipeline
         except KeyboardInterrupt:
             print("\nShutting down...")
-            self.running = False
         finally:
-            heartbeat_task.cancel()
+            self.running = False  # Also stops a transcription in progress
+            for stage in stages[:2]:
+                stage.cancel()
+            # Submit transcripts that are already done, then hand back the rest
+            try:
+                await asyncio.wait_for(self.finished.join(), 30)
+            except asyncio.TimeoutError:
+                pass
+            stages[2].cancel()
+            await self.release_queue()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            listen_task.cancel()
+            print(f"HTTP: {self.http_report()}")
+            await self.http.aclose()
             if self.ws:
                 await self.ws.close()
 